@@ -11,4 +11,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(config("ACCESS_TOKEN_EXPIRE_MINUTES", default=
 
 # Parse KEYS_TO_SHOW from comma-separated string
 KEYS_TO_SHOW_STR = config("KEYS_TO_SHOW", default="")
-KEYS_TO_SHOW = [key.strip() for key in KEYS_TO_SHOW_STR.split(",") if key.strip()] if KEYS_TO_SHOW_STR else []
\ No newline at end of file
+KEYS_TO_SHOW = [key.strip() for key in KEYS_TO_SHOW_STR.split(",") if key.strip()] if KEYS_TO_SHOW_STR else []
+
+# Fraction of matched products kept before the per-group random sort (1.0 = all)
+SAMPLE_RATE = float(config("SAMPLE_RATE", default="1.0"))
+
+# Connection pool of the shared MongoDB client
+MONGO_MAX_POOL_SIZE = int(config("MONGO_MAX_POOL_SIZE", default="50"))
+MONGO_MIN_POOL_SIZE = int(config("MONGO_MIN_POOL_SIZE", default="5"))
+MONGO_MAX_IDLE_TIME_MS = int(config("MONGO_MAX_IDLE_TIME_MS", default="60000"))
+# Wire compression, in order of preference
+MONGO_COMPRESSORS = config("MONGO_COMPRESSORS", default="zstd,zlib")
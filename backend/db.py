@@ -0,0 +1,35 @@
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+from backend.config import (
+    MONGO_URI,
+    DB_NAME,
+    PRODUCTS_COLLECTION,
+    USERS_COLLECTION,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_COMPRESSORS,
+)
+
+
+# Single MongoDB client (and connection pool) shared by the whole app
+mongo_client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    compressors=MONGO_COMPRESSORS,
+    zlibCompressionLevel=6,
+)
+products_collection = mongo_client[DB_NAME][PRODUCTS_COLLECTION]
+users_collection = mongo_client[DB_NAME][USERS_COLLECTION]
+
+
+def get_products_collection() -> AsyncIOMotorCollection:
+    """FastAPI dependency returning the shared products collection."""
+    return products_collection
+
+
+def get_users_collection() -> AsyncIOMotorCollection:
+    """FastAPI dependency returning the shared users collection."""
+    return users_collection
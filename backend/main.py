@@ -1,97 +1,110 @@
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List
 from fastapi import FastAPI, Query, HTTPException, status, Path
-from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
+from fastapi.responses import StreamingResponse
 
-from backend.config import MONGO_URI, DB_NAME, PRODUCTS_COLLECTION, KEYS_TO_SHOW
+from backend.config import KEYS_TO_SHOW, SAMPLE_RATE
+from backend.db import mongo_client, products_collection, users_collection
+from backend.responses import MongoJSONResponse, dump_json
 from backend.routers.users import router as users_router
 from backend.routers.product import router as product_router
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compound index whose prefixes cover the $match of every sampling level
+    await products_collection.create_index(
+        [
+            ("cluster_info.level1_id", 1),
+            ("cluster_info.level2_id", 1),
+            ("cluster_info.level3_id", 1),
+        ]
+    )
+    # Users written before the ObjectId switch used the username as _id
+    await users_collection.update_many(
+        {"username": {"$exists": False}}, [{"$set": {"username": "$_id"}}]
+    )
+    await users_collection.create_index("username", unique=True)
+    yield
+    mongo_client.close()
+
+
+app = FastAPI(default_response_class=MongoJSONResponse, lifespan=lifespan)
 app.include_router(users_router)
 app.include_router(product_router)
 
-# MongoDB client for products
-mongo_client = AsyncIOMotorClient(MONGO_URI)
-products_collection = mongo_client[DB_NAME][PRODUCTS_COLLECTION]
+
+def build_projection(keys_to_show: List[str]) -> Any:
+    """
+    Build the aggregation expression that shapes each sampled product.
+    Nested keys (e.g., "cluster_info.level1_id") are exposed under the last
+    part of their path. With no keys configured the whole document is kept.
+    """
+    if not keys_to_show:
+        return "$$ROOT"
+    return {key_path.split(".")[-1]: f"${key_path}" for key_path in keys_to_show}
 
 
-def get_nested_value(doc: Dict[str, Any], key_path: str) -> Any:
-    """Get value from nested dictionary using dot notation (e.g., 'cluster_info.level1_id')."""
-    keys = key_path.split(".")
-    value = doc
-    for k in keys:
-        if isinstance(value, dict) and k in value:
-            value = value[k]
-        else:
-            return None
-    return value
+# Evaluated by MongoDB so only KEYS_TO_SHOW fields are sent over the wire
+PRODUCT_PROJECTION = build_projection(KEYS_TO_SHOW)
 
 
-def serialize_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+def build_sample_pipeline(
+    match_stage: Dict[str, Any],
+    group_key: str,
+    sample_size: int,
+    projection: Any,
+    sample_rate: float = 1.0
+) -> List[Dict[str, Any]]:
     """
-    Convert ObjectId to string for JSON serialization and filter by KEYS_TO_SHOW.
-    Only includes keys specified in KEYS_TO_SHOW environment variable.
+    Build the per-group sampling pipeline.
+
+    Stage order is fixed on purpose: $match always comes first so it can use
+    the cluster_info index, and the projection is only applied while picking
+    the sampled documents. Projecting before the $match would force a full
+    collection scan before any sampling happens.
+
+    A sample_rate below 1.0 adds a $sampleRate filter right after the $match,
+    so only that fraction of each group reaches the random sort. Groups with
+    fewer than sample_size / sample_rate products may then return fewer than
+    sample_size products.
     """
-    if doc is None:
-        return None
-    
-    # If no keys specified, return all keys (backward compatibility)
-    if not KEYS_TO_SHOW:
-        result = {}
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, dict):
-                result[key] = serialize_document(value)
-            elif isinstance(value, list):
-                result[key] = [
-                    serialize_document(item) if isinstance(item, dict) else item
-                    for item in value
-                ]
-            else:
-                result[key] = value
-        return result
-    
-    # Filter by KEYS_TO_SHOW
-    result = {}
-    for key_path in KEYS_TO_SHOW:
-        if "." in key_path:
-            # Handle nested keys (e.g., "cluster_info.level1_id")
-            value = get_nested_value(doc, key_path)
-            if value is not None:
-                # Use the last part of the key path as the result key
-                result_key = key_path.split(".")[-1]
-                if isinstance(value, ObjectId):
-                    result[result_key] = str(value)
-                elif isinstance(value, dict):
-                    result[result_key] = serialize_document(value)
-                elif isinstance(value, list):
-                    result[result_key] = [
-                        serialize_document(item) if isinstance(item, dict) else item
-                        for item in value
-                    ]
-                else:
-                    result[result_key] = value
-        else:
-            # Handle top-level keys
-            if key_path in doc:
-                value = doc[key_path]
-                if isinstance(value, ObjectId):
-                    result[key_path] = str(value)
-                elif isinstance(value, dict):
-                    result[key_path] = serialize_document(value)
-                elif isinstance(value, list):
-                    result[key_path] = [
-                        serialize_document(item) if isinstance(item, dict) else item
-                        for item in value
-                    ]
-                else:
-                    result[key_path] = value
-    
-    return result
+    pipeline = [{"$match": {**match_stage, group_key: {"$exists": True}}}]
+    if sample_rate < 1.0:
+        pipeline.append({"$match": {"$sampleRate": sample_rate}})
+    pipeline += [
+        {"$addFields": {"_r": {"$rand": {}}}},
+        {"$sort": {"_r": 1}},
+        {
+            "$group": {
+                "_id": f"${group_key}",
+                "docs": {"$firstN": {"input": projection, "n": sample_size}}
+            }
+        },
+        {"$unset": "docs._r"},
+        {"$sort": {"_id": 1}}
+    ]
+    return pipeline
+
+
+async def sample_groups(
+    match_stage: Dict[str, Any], group_key: str, sample_size: int
+) -> Dict[Any, List[Dict[str, Any]]]:
+    """
+    Randomly sample products from each group in a single aggregation.
+
+    Every matched document gets a random sort key, so taking the first
+    sample_size documents of each group is a uniform per-group sample.
+    Sampled documents are shaped by PRODUCT_PROJECTION on the server.
+    Groups are returned ordered by their id.
+    """
+    pipeline = build_sample_pipeline(
+        match_stage, group_key, sample_size, PRODUCT_PROJECTION, SAMPLE_RATE
+    )
 
+    cursor = products_collection.aggregate(pipeline, allowDiskUse=True)
+    groups = await cursor.to_list(length=None)
+    return {group["_id"]: group["docs"] for group in groups}
 
 
 @app.get("/")
@@ -111,44 +124,30 @@ async def sample_products_by_level1(
         if level1_id is not None:
             match_stage["cluster_info.level1_id"] = level1_id
         
-        # First, get distinct level1_id values
-        if level1_id is not None:
-            distinct_level1_ids = [level1_id]
-        else:
-            distinct_level1_ids = await products_collection.distinct("cluster_info.level1_id")
+        # Sample every level1_id group in a single aggregation
+        sampled = await sample_groups(match_stage, "cluster_info.level1_id", sample_size)
         
-        if not distinct_level1_ids:
+        if not sampled:
             return {
                 "message": "No products found with cluster_info.level1_id",
                 "results": {}
             }
         
-        # For each level1_id, sample products
         results = {}
-        for l1_id in distinct_level1_ids:
-            # Build aggregation pipeline for this level1_id
-            pipeline = [
-                {"$match": {"cluster_info.level1_id": l1_id}},
-                {"$sample": {"size": sample_size}}
-            ]
-            
-            # Execute aggregation
-            cursor = products_collection.aggregate(pipeline)
-            sampled_products = []
-            async for doc in cursor:
-                sampled_products.append(serialize_document(doc))
-            
+        for l1_id, sampled_products in sampled.items():
             results[str(l1_id)] = {
                 "level1_id": l1_id,
                 "sample_size": len(sampled_products),
                 "products": sampled_products
             }
         
-        return {
-            "message": f"Sampled {sample_size} products from each level1_id group",
-            "total_groups": len(distinct_level1_ids),
-            "results": results
-        }
+        return MongoJSONResponse(
+            content={
+                "message": f"Sampled {sample_size} products from each level1_id group",
+                "total_groups": len(results),
+                "results": results
+            }
+        )
     
     except Exception as e:
         raise HTTPException(
@@ -157,6 +156,38 @@ async def sample_products_by_level1(
         )
 
 
+@app.get("/stream")
+async def stream_products_by_level1(
+    sample_size: int = Query(default=3, ge=1, description="Number of products to sample from each level1_id group"),
+    level1_id: int = Query(None, description="Optional: filter by specific level1_id")
+):
+    """
+    Same sampling as the root endpoint, streamed as NDJSON with one line per level1_id group.
+    
+    - **sample_size**: Number of products to randomly sample from each level1_id group
+    - **level1_id**: Optional filter to only return samples for a specific level1_id
+    """
+    match_stage = {}
+    if level1_id is not None:
+        match_stage["cluster_info.level1_id"] = level1_id
+    
+    pipeline = build_sample_pipeline(
+        match_stage, "cluster_info.level1_id", sample_size, PRODUCT_PROJECTION, SAMPLE_RATE
+    )
+    
+    async def generate():
+        # Each group is written as soon as the cursor yields it
+        cursor = products_collection.aggregate(pipeline, allowDiskUse=True)
+        async for group in cursor:
+            yield dump_json({
+                "level1_id": group["_id"],
+                "sample_size": len(group["docs"]),
+                "products": group["docs"]
+            }) + b"\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @app.get("/sub/{level1_id}")
 async def sample_products_by_level2(
     level1_id: int = Path(..., description="level1_id to filter products"),
@@ -169,47 +200,19 @@ async def sample_products_by_level2(
     - **sample_size**: Number of products to randomly sample from each level2_id group
     """
     try:
-        # First, check if any products exist with this level1_id
-        count = await products_collection.count_documents({"cluster_info.level1_id": level1_id})
-        if count == 0:
+        # Sample every level2_id group in a single aggregation
+        sampled = await sample_groups(
+            {"cluster_info.level1_id": level1_id}, "cluster_info.level2_id", sample_size
+        )
+        
+        if not sampled:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No products found with cluster_info.level1_id={level1_id}"
             )
         
-        # Get distinct level2_id values for this level1_id
-        distinct_level2_ids = await products_collection.distinct(
-            "cluster_info.level2_id",
-            {"cluster_info.level1_id": level1_id}
-        )
-        
-        if not distinct_level2_ids:
-            return {
-                "message": f"No products found with cluster_info.level1_id={level1_id}",
-                "level1_id": level1_id,
-                "results": {}
-            }
-        
-        # For each level2_id, sample products
         results = {}
-        for l2_id in distinct_level2_ids:
-            # Build aggregation pipeline for this level2_id
-            pipeline = [
-                {
-                    "$match": {
-                        "cluster_info.level1_id": level1_id,
-                        "cluster_info.level2_id": l2_id
-                    }
-                },
-                {"$sample": {"size": sample_size}}
-            ]
-            
-            # Execute aggregation
-            cursor = products_collection.aggregate(pipeline)
-            sampled_products = []
-            async for doc in cursor:
-                sampled_products.append(serialize_document(doc))
-            
+        for l2_id, sampled_products in sampled.items():
             results[str(l2_id)] = {
                 "level1_id": level1_id,
                 "level2_id": l2_id,
@@ -217,12 +220,14 @@ async def sample_products_by_level2(
                 "products": sampled_products
             }
         
-        return {
-            "message": f"Sampled {sample_size} products from each level2_id group for level1_id={level1_id}",
-            "level1_id": level1_id,
-            "total_groups": len(distinct_level2_ids),
-            "results": results
-        }
+        return MongoJSONResponse(
+            content={
+                "message": f"Sampled {sample_size} products from each level2_id group for level1_id={level1_id}",
+                "level1_id": level1_id,
+                "total_groups": len(results),
+                "results": results
+            }
+        )
     
     except HTTPException:
         raise
@@ -247,53 +252,22 @@ async def sample_products_by_level3(
     - **sample_size**: Number of products to randomly sample from each level3_id group
     """
     try:
-        # First, check if any products exist with this level1_id and level2_id
         filter_query = {
             "cluster_info.level1_id": level1_id,
             "cluster_info.level2_id": level2_id
         }
-        count = await products_collection.count_documents(filter_query)
-        if count == 0:
+        
+        # Sample every level3_id group in a single aggregation
+        sampled = await sample_groups(filter_query, "cluster_info.level3_id", sample_size)
+        
+        if not sampled:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No products found with cluster_info.level1_id={level1_id} and cluster_info.level2_id={level2_id}"
             )
         
-        # Get distinct level3_id values for this level1_id and level2_id
-        distinct_level3_ids = await products_collection.distinct(
-            "cluster_info.level3_id",
-            filter_query
-        )
-        
-        if not distinct_level3_ids:
-            return {
-                "message": f"No products found with cluster_info.level1_id={level1_id} and cluster_info.level2_id={level2_id}",
-                "level1_id": level1_id,
-                "level2_id": level2_id,
-                "results": {}
-            }
-        
-        # For each level3_id, sample products
         results = {}
-        for l3_id in distinct_level3_ids:
-            # Build aggregation pipeline for this level3_id
-            pipeline = [
-                {
-                    "$match": {
-                        "cluster_info.level1_id": level1_id,
-                        "cluster_info.level2_id": level2_id,
-                        "cluster_info.level3_id": l3_id
-                    }
-                },
-                {"$sample": {"size": sample_size}}
-            ]
-            
-            # Execute aggregation
-            cursor = products_collection.aggregate(pipeline)
-            sampled_products = []
-            async for doc in cursor:
-                sampled_products.append(serialize_document(doc))
-            
+        for l3_id, sampled_products in sampled.items():
             results[str(l3_id)] = {
                 "level1_id": level1_id,
                 "level2_id": level2_id,
@@ -302,13 +276,15 @@ async def sample_products_by_level3(
                 "products": sampled_products
             }
         
-        return {
-            "message": f"Sampled {sample_size} products from each level3_id group for level1_id={level1_id} and level2_id={level2_id}",
-            "level1_id": level1_id,
-            "level2_id": level2_id,
-            "total_groups": len(distinct_level3_ids),
-            "results": results
-        }
+        return MongoJSONResponse(
+            content={
+                "message": f"Sampled {sample_size} products from each level3_id group for level1_id={level1_id} and level2_id={level2_id}",
+                "level1_id": level1_id,
+                "level2_id": level2_id,
+                "total_groups": len(results),
+                "results": results
+            }
+        )
     
     except HTTPException:
         raise
@@ -0,0 +1,34 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId, json_util
+from fastapi.responses import JSONResponse
+
+
+def _default(obj: Any) -> Any:
+    """Serialize the BSON types orjson does not know about."""
+    if type(obj) is ObjectId:
+        return str(obj)
+    # Other BSON types (Decimal128, Binary, Timestamp, ...) as relaxed Extended JSON
+    return json_util.default(obj, json_options=json_util.RELAXED_JSON_OPTIONS)
+
+
+def dump_json(content: Any) -> bytes:
+    """Serialize content that may contain raw MongoDB values to JSON bytes."""
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+    )
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    orjson-backed JSONResponse that accepts raw MongoDB documents.
+
+    ObjectId values are converted while orjson serializes the content, so
+    documents no longer need a Python-level walk before being returned.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
@@ -1,56 +1,34 @@
-from typing import Dict, Any
-from fastapi import APIRouter, HTTPException, status, Path
-from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
-from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, status, Path
+from motor.motor_asyncio import AsyncIOMotorCollection
 
-from backend.config import MONGO_URI, DB_NAME, PRODUCTS_COLLECTION
+from backend.db import get_products_collection
+from backend.responses import MongoJSONResponse
 
 
 router = APIRouter(prefix="/product", tags=["product"])
 
-# MongoDB client for products
-mongo_client = AsyncIOMotorClient(MONGO_URI)
-products_collection = mongo_client[DB_NAME][PRODUCTS_COLLECTION]
-
-
-def serialize_document(doc: Dict[str, Any]) -> Dict[str, Any]:
-    """Convert ObjectId to string for JSON serialization."""
-    if doc is None:
-        return None
-    result = {}
-    for key, value in doc.items():
-        if isinstance(value, ObjectId):
-            result[key] = str(value)
-        elif isinstance(value, dict):
-            result[key] = serialize_document(value)
-        elif isinstance(value, list):
-            result[key] = [
-                serialize_document(item) if isinstance(item, dict) else item
-                for item in value
-            ]
-        else:
-            result[key] = value
-    return result
-
 
 @router.get("/{product_id}")
-async def get_product(product_id: str = Path(..., description="Product ID to retrieve")):
+async def get_product(
+    product_id: str = Path(..., description="Product ID to retrieve"),
+    products_collection: AsyncIOMotorCollection = Depends(get_products_collection)
+):
     """
     Get a product by its ID.
     
-    - **product_id**: The ID of the product to retrieve (can be ObjectId or string)
+    - **product_id**: The numeric ID of the product to retrieve
     """
     try:
-        # Try to convert to ObjectId if it's a valid ObjectId string
-        try:
-            product_oid = ObjectId(product_id)
-            query = {"_id": int(product_oid)}
-        except (InvalidId, ValueError):
-            # If not a valid ObjectId, search as string
-            query = {"_id": int(product_id)}
+        doc_id = int(product_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Product id '{product_id}' must be an integer"
+        )
+
+    try:
         # Find the product
-        product = await products_collection.find_one(query)
+        product = await products_collection.find_one({"_id": doc_id})
         
         if product is None:
             raise HTTPException(
@@ -58,8 +36,7 @@ async def get_product(product_id: str = Path(..., description="Product ID to ret
                 detail=f"Product with id '{product_id}' not found"
             )
         
-        # Serialize and return
-        return serialize_document(product)
+        return MongoJSONResponse(content=product)
     
     except HTTPException:
         raise
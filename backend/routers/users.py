@@ -3,22 +3,26 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorCollection
 from pwdlib import PasswordHash
 from pymongo.errors import DuplicateKeyError
 from pydantic import BaseModel, Field
 from jwt import PyJWTError
 import jwt
-from backend.config import MONGO_URI, DB_NAME, USERS_COLLECTION, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from backend.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from backend.db import get_users_collection
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])   
 password_hasher = PasswordHash.recommended()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-mongo_client = AsyncIOMotorClient(MONGO_URI)
-users_collection = mongo_client[DB_NAME][USERS_COLLECTION]
+# Decoder state built once instead of on every authenticated request
+jwt_decoder = jwt.PyJWT(options={"require": ["exp", "sub"], "verify_signature": True})
+JWT_ALGORITHMS = [ALGORITHM]
+JWT_KEY = SECRET_KEY.encode()
 
 
 class UserCreate(BaseModel):
@@ -35,12 +39,13 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
-def get_password_hash(password: str) -> str:
-    return password_hasher.hash(password)
+# Argon2 is CPU-bound, so hashing runs in the threadpool to keep the event loop free
+async def get_password_hash(password: str) -> str:
+    return await run_in_threadpool(password_hasher.hash, password)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return password_hasher.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await run_in_threadpool(password_hasher.verify, plain_password, hashed_password)
 
 
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
@@ -48,36 +53,43 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
     expire_delta = expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     expire = datetime.now(timezone.utc) + expire_delta
     to_encode["exp"] = expire
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, JWT_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserRead:
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    users_collection: AsyncIOMotorCollection = Depends(get_users_collection),
+) -> UserRead:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail={"message": "Could not validate credentials"},
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt_decoder.decode(token, JWT_KEY, algorithms=JWT_ALGORITHMS)
         username: Optional[str] = payload.get("sub")
         if username is None:
             raise credentials_exception
     except PyJWTError as exc:
         raise credentials_exception from exc
 
-    user_record = await users_collection.find_one({"_id": username})
+    user_record = await users_collection.find_one(
+        {"username": username}, {"_id": 0, "username": 1}
+    )
     if user_record is None:
         raise credentials_exception
 
-    return UserRead(username=user_record["_id"])
+    return UserRead(username=user_record["username"])
 
 
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-async def register_user(user: UserCreate) -> UserRead:
-    hashed_password = get_password_hash(user.password)
+async def register_user(
+    user: UserCreate,
+    users_collection: AsyncIOMotorCollection = Depends(get_users_collection),
+) -> UserRead:
+    hashed_password = await get_password_hash(user.password)
     document = {
-        #TODO change to ObjectId
-        "_id": user.username,
+        "username": user.username,
         "hashed_password": hashed_password,
         "created_at": datetime.now(timezone.utc),
     }
@@ -93,11 +105,16 @@ async def register_user(user: UserCreate) -> UserRead:
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> Token:
-    user_record = await users_collection.find_one({"_id": form_data.username})
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    users_collection: AsyncIOMotorCollection = Depends(get_users_collection),
+) -> Token:
+    user_record = await users_collection.find_one(
+        {"username": form_data.username}, {"_id": 0, "hashed_password": 1}
+    )
     if (
         not user_record
-        or not verify_password(form_data.password, user_record["hashed_password"])
+        or not await verify_password(form_data.password, user_record["hashed_password"])
     ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -7,40 +7,60 @@ for each brand of mobile phone, and handle pagination with concurrent requests.
 """
 
 import asyncio
+import functools
 import os
 from datetime import datetime
-import json
+from operator import itemgetter
+from typing import AsyncIterator
 
-from httpx import AsyncClient
+import ijson
+import orjson
+from httpx import Response
 from .config import ENABLE_LOGGING, URL, QUERY, TIMEOUT
+from .util.async_stream import AsyncByteStream
 from .util.async_timer import async_time
+from .util.http_client import (
+    build_client,
+    raise_for_retryable_status,
+    retry_transient,
+)
 from .util.logger import setup_logger
 import logging
 
 ### Setup logger
-if ENABLE_LOGGING:
-    # Get the current date and time for log file naming
-    current_time = datetime.now()
+# Handlers are attached lazily, so importing this module has no file side effects
+logger = logging.getLogger("Mobile_Ids_Extractor")
+
+
+@functools.lru_cache(maxsize=None)
+def _setup_logging() -> None:
+    """
+    Attach console and file handlers to the module logger, once per process.
+    """
+    if not ENABLE_LOGGING:
+        return
 
     # Format the date and time into a string suitable for a filename
     # Format: YYYY-MM-DD_HH-MM-SS
-    timestamp = current_time.strftime("%Y-%m-%d_%H-%M-%S")
-
-    # Construct the log filename with timestamp to avoid conflicts
-    log_filename = f"logs/brand_ex_{timestamp}.log"
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     # Get the directory of the current script for relative path resolution
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    # Define the full path for the log file
-    log_file_path = os.path.join(script_dir, log_filename)
+    # Construct the log file path with timestamp to avoid conflicts
+    log_file_path = os.path.join(script_dir, "logs", f"brand_ex_{timestamp}.log")
+    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
 
     # Initialize logger with module name and file path
-    logger = setup_logger("Mobile_Ids_Extractor", log_file_path=log_file_path)
+    setup_logger("Mobile_Ids_Extractor", log_file_path=log_file_path)
 
-else:
-    logger = logging.getLogger("Test")
 
+# Upper bound on in-flight requests; under HTTP/2 these are streams, not sockets
+MAX_CONCURRENT_REQUESTS = 100
+
+# Field getters for decoded API items, built once for the per-page hot path
+_GET_ID = itemgetter("id")
+_GET_BRAND = itemgetter("id", "code")
 
 class Extractor:
     """
@@ -50,7 +70,13 @@ class Extractor:
     with proper error handling and logging.
     """
 
-    def __init__(self, base_url: str, query: str, timeout: int) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        query: str,
+        timeout: int,
+        concurrency: int = MAX_CONCURRENT_REQUESTS,
+    ) -> None:
         """
         Initialize the Extractor with API configuration.
 
@@ -58,84 +84,182 @@ class Extractor:
             base_url (str): Base URL for the Digikala API endpoint
             query (str): Query string template for pagination (e.g., "?sort=4&page=")
             timeout (int): Timeout in seconds for HTTP requests
+            concurrency (int): Maximum number of in-flight requests (default: 100)
         """
+        _setup_logging()
         self.base_url = base_url
         self.query = query
-        self.client = AsyncClient(timeout=timeout, follow_redirects=True)
+        # One persistent HTTP/2 client; requests share a handful of multiplexed connections
+        self.client = build_client(timeout)
         self.timeout = timeout
+        # Single gate for every request made by this extractor
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Brand discovery shared by every caller of get_all_brands
+        self._brands_task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "Extractor":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        # Release the pooled connections when the extraction is finished
+        await self.client.aclose()
 
-    @async_time()
     async def get_all_brands(self) -> set:
         """
         Fetch all available brands from the API.
 
+        The brand list is requested once per extractor; concurrent and later
+        calls await the same request. An empty (failed) result is not kept.
+
+        Returns:
+            set: Set of tuples containing (brand_id, brand_code) for all brands
+        """
+        if self._brands_task is None:
+            self._brands_task = asyncio.create_task(self._fetch_all_brands())
+        all_brands = await asyncio.shield(self._brands_task)
+        if not all_brands:
+            # Let the next call retry the request
+            self._brands_task = None
+        return set(all_brands)
+
+    @async_time(logger)
+    async def _fetch_all_brands(self) -> set:
+        """
+        Request and decode the brand options of the unfiltered listing.
+
         Returns:
             set: Set of tuples containing (brand_id, brand_code) for all brands
         """
         try:
-            # Make request to get brand information
-            req = await self.client.get(url=self.base_url)
-        except Exception as e:
-            logger.error(f"Error fetching all brands: {e}", exc_info=True)
-            return set()
-        try:
-            res = req.json()
+            return await self._stream_brands()
         except Exception as e:
-            logger.error(
-                f"Error extracting brands: {e} with status code {req.status_code}",
-                exc_info=True,
-            )
+            logger.error("Error fetching all brands: %s", e, exc_info=True)
             return set()
 
-        # Extract brand options from API response
-        # TODO: parameterize this as a query parameter
-        brands = res["data"]["filters"]["brands"]["options"]
+    @retry_transient
+    async def _stream_brands(self) -> set:
+        """
+        Stream the unfiltered listing and decode only its brand options.
 
-        # Create set of (id, code) tuples for all brands
-        all_brands = {(brand["id"], brand["code"]) for brand in brands}
+        Returns:
+            set: Set of (brand_id, brand_code) tuples, or an empty set if the
+            body could not be decoded
+        """
+        async with self.semaphore:
+            async with self.client.stream("GET", url=self.base_url) as req:
+                raise_for_retryable_status(req)
+                try:
+                    # TODO: parameterize this as a query parameter
+                    brands = ijson.items(
+                        AsyncByteStream(req.aiter_bytes()),
+                        "data.filters.brands.options.item",
+                    )
+                    # Create set of (id, code) tuples for all brands
+                    return {_GET_BRAND(brand) async for brand in brands}
+                except Exception as e:
+                    logger.error(
+                        "Error extracting brands: %s with status code %s",
+                        e,
+                        req.status_code,
+                        exc_info=True,
+                    )
+                    return set()
 
-        return all_brands
+    @retry_transient
+    async def _get(self, url: str) -> Response:
+        """
+        GET a URL, retrying transport errors and transient status codes.
 
-    @async_time()
-    async def get_total_pages_of_each_brand(self, brand_id: int) -> int:
+        Args:
+            url (str): URL to request
+
+        Returns:
+            Response: The (non-streamed) response
         """
-        Get the total number of pages for products of a specific brand.
+        async with self.semaphore:
+            resp = await self.client.get(url=url)
+        raise_for_retryable_status(resp)
+        return resp
+
+    def _page_url_prefix(self, brand_id: int) -> str:
+        """
+        Build the listing URL of a brand up to (not including) the page number.
+
+        Args:
+            brand_id (int): ID of the brand
+
+        Returns:
+            str: URL prefix that a page number is appended to
+        """
+        # TODO: this is business logic . parameterize this as a query parameter
+        return f"{self.base_url}?brand[0]={brand_id}&page="
+
+    def _page_url(self, brand_id: int, page_num: int) -> str:
+        """
+        Build the URL of one listing page of a brand.
+
+        Args:
+            brand_id (int): ID of the brand
+            page_num (int): Page number to fetch
+
+        Returns:
+            str: URL of the requested page
+        """
+        return self._page_url_prefix(brand_id) + str(page_num)
+
+    async def get_first_page_of_each_brand(self, brand_id: int) -> tuple[int, set]:
+        """
+        Fetch the first page of a brand once, for both its pager and its products.
 
         Args:
             brand_id (int): ID of the brand to check
 
         Returns:
-            int: Total number of pages for the brand's products
+            tuple: (total_pages, set_of_product_ids_on_page_1), or (0, set()) on error
         """
-        # Make request with brand filter to get pagination info
         try:
-            req = await self.client.get(
-                # TODO: this is business logic . parameterize this as a query parameter
-                url=f"{self.base_url}?has_selling_stock=1&brand[0]={brand_id}&page=1"
-            )
+            req = await self._get(self._page_url(brand_id, 1))
         except Exception as e:
             logger.error(
-                f"Error fetching total pages of brand {brand_id}: {e}",
+                "Error fetching first page of brand %s: %s",
+                brand_id,
+                e,
                 exc_info=True,
             )
-            return 0
+            return 0, set()
         try:
-            res = req.json()
+            data = orjson.loads(req.content)["data"]
+            # Extract total pages and the products already on page 1
+            # TODO: parameterize this as a query parameter
+            total_pages = data["pager"]["total_pages"]
+            product_ids = set(map(_GET_ID, data["products"]))
         except Exception as e:
             logger.error(
-                f"Error extracting total pages of brand {brand_id}: {e} with status code {req.status_code}",
+                "Error extracting first page of brand %s: %s with status code %s",
+                brand_id,
+                e,
+                req.status_code,
                 exc_info=True,
             )
-            return 0
-        # Extract total pages from response
-        # TODO: parameterize this as a query parameter
-        total_page = res["data"]["pager"]["total_pages"]
+            return 0, set()
 
-        return total_page
+        return total_pages, product_ids
+
+    async def get_total_pages_of_each_brand(self, brand_id: int) -> int:
+        """
+        Get the total number of pages for products of a specific brand.
+
+        Args:
+            brand_id (int): ID of the brand to check
+
+        Returns:
+            int: Total number of pages for the brand's products
+        """
+        total_pages, _ = await self.get_first_page_of_each_brand(brand_id)
+        return total_pages
 
-    @async_time()
     async def get_product_ids_of_each_brand(
-        self, brand_id: int, total_pages: int
+        self, brand_id: int, total_pages: int, start_page: int = 1
     ) -> set:
         """
         Fetch all product IDs for a specific brand across all its pages.
@@ -143,101 +267,101 @@ class Extractor:
         Args:
             brand_id (int): ID of the brand to fetch products for
             total_pages (int): Total number of pages for this brand
+            start_page (int): First page to fetch (default: 1)
 
         Returns:
             set: Set of all product IDs for the specified brand
         """
-        # Limit concurrent requests to avoid overwhelming the server
-        semaphore = asyncio.Semaphore(5)
+        # Built once per brand; each page only appends its number
+        url_prefix = self._page_url_prefix(brand_id)
 
-        async def fetch_page(page_num: int) -> set:
+        @retry_transient
+        async def stream_page(page_num: int) -> set:
             """
-            Fetch product IDs from a specific page of a brand.
+            Stream one page of a brand and decode only its product IDs.
 
             Args:
                 page_num (int): Page number to fetch
 
             Returns:
-                set: Set of product IDs from the specified page
+                set: Set of product IDs, or an empty set if the body could not be decoded
             """
-            async with semaphore:
-                try:
-                    # Construct URL with brand filter and page number
-                    # TODO: this is business logic . parameterize this as a query parameter
+            async with self.semaphore:
+                # Construct URL with brand filter and page number
+                async with self.client.stream(
+                    "GET", url=url_prefix + str(page_num)
+                ) as resp:
+                    raise_for_retryable_status(resp)
                     try:
-                        resp = await self.client.get(
-                            url=f"{self.base_url}?brand[0]={brand_id}&page={page_num}"
+                        # Stream the page and decode only the product IDs
+                        ids = ijson.items(
+                            AsyncByteStream(resp.aiter_bytes()),
+                            "data.products.item.id",
                         )
+                        return {product_id async for product_id in ids}
                     except Exception as e:
                         logger.error(
-                            f"Error fetching page {page_num} of category {brand_id}: {e}",
+                            "Error extracting page %s of category %s: %s with status code %s",
+                            page_num,
+                            brand_id,
+                            e,
+                            resp.status_code,
                             exc_info=True,
                         )
                         return set()
-                    try:
-                        result = resp.json()
-                    except Exception as e:
-                        logger.error(
-                            f"Error extracting page {page_num} of category {brand_id}: {e} with status code {resp.status_code}",
-                            exc_info=True,
-                        )
-                        return set()
-                    # Extract product IDs from response
-                    products = result["data"]["products"]
-                    return {product["id"] for product in products}
-                except Exception as e:
-                    logger.error(
-                        f"Error fetching page {page_num} of category {brand_id}: {e}",
-                        exc_info=True,
-                    )
-                    return set()
-
-        # Create tasks for all pages of the brand
-        tasks = [asyncio.create_task(fetch_page(i)) for i in range(1, total_pages + 1)]
 
-        # Wait for all tasks with timeout
-        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
-
-        # Cancel pending tasks (commented out to avoid cancellation errors)
-        # for task in pending:
-        #   task.cancel()
+        async def fetch_page(page_num: int) -> set:
+            """
+            Fetch product IDs from a specific page of a brand.
 
-        logger.debug(f"Done task : {len(done)} , Pending tassk : {len(pending)} ")
+            Args:
+                page_num (int): Page number to fetch
 
-        # Collect results from completed tasks
+            Returns:
+                set: Set of product IDs from the specified page
+            """
+            try:
+                return await stream_page(page_num)
+            except Exception as e:
+                logger.error(
+                    "Error fetching page %s of category %s: %s",
+                    page_num,
+                    brand_id,
+                    e,
+                    exc_info=True,
+                )
+                return set()
+
+        # Fetch all pages of the brand; the client timeout bounds each request.
+        # Pages are merged as they complete so their ids are not held until the
+        # slowest page returns
         product_ids = set()
-        for task in done:
+        for next_page in asyncio.as_completed(
+            [fetch_page(i) for i in range(start_page, total_pages + 1)]
+        ):
             try:
-                product_ids.update(task.result())
+                product_ids.update(await next_page)
             except Exception as e:
-                logger.error(f"Error processing task result: {e}", exc_info=True)
+                logger.error("Error in processing a page of brand %s: %s", brand_id, e)
 
         return product_ids
 
-    async def get_all_ids_by_brand(self) -> dict:
+    async def iter_ids_by_brand(self) -> AsyncIterator[tuple[int, set]]:
         """
-        Main method to fetch all product IDs organized by brand.
+        Yield the product IDs of every brand as soon as that brand completes.
 
-        This method:
-        1. Gets all available brands
-        2. For each brand, fetches all its product IDs
-        3. Returns a dictionary mapping brand_id to list of product_ids
-
-        Returns:
-            dict: Dictionary with brand_id as key and list of product_ids as value
+        Yields:
+            tuple: (brand_id, set_of_product_ids) for each brand with products
 
         Note:
-            Uses concurrent processing for all brands with semaphore limiting
+            Uses concurrent processing for all brands; requests are limited
+            by the extractor-wide semaphore
         """
         # Get all available brands first
         all_brands = await self.get_all_brands()
 
-        logger.info(f"Found {len(all_brands)} Brands and are {all_brands}")
-
-        # Limit concurrent brand processing
-        semaphore = asyncio.Semaphore(5)
+        logger.info("Found %s Brands and are %s", len(all_brands), all_brands)
 
-        @async_time()
         async def get_all_ids_of_brand(brand_id):
             """
             Fetch all product IDs for a single brand.
@@ -246,67 +370,95 @@ class Extractor:
                 brand_id (int): ID of the brand to process
 
             Returns:
-                tuple: (brand_id, set_of_product_ids) or empty dict on error
+                tuple: (brand_id, set_of_product_ids), with an empty set on error
             """
-            async with semaphore:
-                try:
-                    # Get total pages for this brand
-                    total_pages = await self.get_total_pages_of_each_brand(brand_id)
-                    if total_pages:
-                        # Fetch all product IDs for this brand
-                        product_ids = await self.get_product_ids_of_each_brand(
-                            brand_id, total_pages=total_pages
-                        )
-
-                        logger.info(
-                            f"{total_pages} pages and {len(product_ids)} ids found from {brand_id}"
-                        )
-
-                        return brand_id, product_ids
-                    else:
-                        # No pages found for this brand
-                        return brand_id, set()
-
-                except Exception as e:
-                    logger.error(
-                        f"Error fetching Brand {brand_id} : {e}", exc_info=True
+            try:
+                # Page 1 gives the page count and its own products in one request
+                total_pages, product_ids = await self.get_first_page_of_each_brand(
+                    brand_id
+                )
+                if total_pages > 1:
+                    # Fetch the product IDs of the remaining pages
+                    product_ids |= await self.get_product_ids_of_each_brand(
+                        brand_id, total_pages=total_pages, start_page=2
                     )
-                    return dict()
 
-        # Create tasks for all brands
-        tasks = [
-            asyncio.create_task(get_all_ids_of_brand(brand_id=brand[0]))
-            for brand in all_brands
-        ]
+                logger.info(
+                    "%s pages and %s ids found from %s",
+                    total_pages,
+                    len(product_ids),
+                    brand_id,
+                )
 
-        # Wait for all brand processing tasks to complete
-        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+                return brand_id, product_ids
 
-        logger.debug(f"Done Task : {len(done)} ,Pending : {len(pending)}")
-
-        # Collect results into final dictionary
-        all_product_ids = dict()
-        for task in done:
+            except Exception as e:
+                logger.error(
+                    "Error fetching Brand %s : %s", brand_id, e, exc_info=True
+                )
+                return brand_id, set()
+
+        # Process all brands concurrently and yield each one as it completes;
+        # a failing brand does not cancel the others
+        for next_brand in asyncio.as_completed(
+            [get_all_ids_of_brand(brand_id=brand[0]) for brand in all_brands]
+        ):
             try:
-                c, ids = task.result()
-                # Convert set to list for JSON serialization compatibility
-                all_product_ids[c] = list(ids)
+                c, ids = await next_brand
             except Exception as e:
-                logger.error(f"Error in processing task with {e}", exc_info=True)
+                logger.error("Error in processing task with %s", e, exc_info=True)
+                continue
+            # Brands that failed or have no products are left out of the output
+            if ids:
+                yield c, ids
+
+    @async_time(logger)
+    async def get_all_ids_by_brand(self) -> dict:
+        """
+        Main method to fetch all product IDs organized by brand.
 
-        logger.info(f"Found {len(all_product_ids)} ids {all_product_ids}")
+        This method:
+        1. Gets all available brands
+        2. For each brand, fetches all its product IDs
+        3. Returns a dictionary mapping brand_id to list of product_ids
+
+        Returns:
+            dict: Dictionary with brand_id as key and list of product_ids as value
+        """
+        # Convert set to list for JSON serialization compatibility
+        all_product_ids = {c: list(ids) async for c, ids in self.iter_ids_by_brand()}
+
+        logger.info("Found %s ids %s", len(all_product_ids), all_product_ids)
         return all_product_ids
 
+    @async_time(logger)
+    async def save_ids_by_brand(self, file_path: str) -> int:
+        """
+        Write the product IDs of every brand to an NDJSON file as brands complete.
+
+        Each line is {"brand": brand_id, "ids": [product_id, ...]}, so only one
+        brand's IDs are held in memory at a time and readers can consume the
+        file line by line with orjson.loads.
+
+        Args:
+            file_path (str): Path to the output NDJSON file
+
+        Returns:
+            int: Number of brands written
+        """
+        written = 0
+        with open(file_path, "wb") as f:
+            async for c, ids in self.iter_ids_by_brand():
+                f.write(orjson.dumps({"brand": c, "ids": list(ids)}) + b"\n")
+                written += 1
+
+        logger.info("Saved ids of %s brands to %s", written, file_path)
+        return written
+
 
 # # Example usage (commented out):
-# e = Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT)
-# brands_info = asyncio.run(e.get_all_ids_by_brand())
-
-# # Load brand information from file
-# file_path = f"data/original_data/brand_ex_{timestamp}.json"
-# try:
-#     with open(file_path, "w") as f:
-#         brands_info = json.dump(brands_info, f)
-# except Exception as e:
-#     print(f"File not found and accure erroe {e} ")
-#     brands_info = None
+# async def run():
+#     async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as e:
+#         # One NDJSON line per brand: {"brand": brand_id, "ids": [...]}
+#         return await e.save_ids_by_brand(f"data/original_data/brand_ex_{timestamp}.ndjson")
+# asyncio.run(run())
@@ -1,14 +1,68 @@
+from dataclasses import dataclass
+
 from decouple import config
 
-URL = config("URL")
-QUERY = str(config("QUERY"))
-TIMEOUT = int(config("TIMEOUT"))
-ENABLE_LOGGING = bool(int((config("ENABLE_LOGGING"))))
-COMMENTS_BASE_URL = str(config("COMMENTS_BASE_URL"))
-PRODUCT_BASE_URL = str(config("PRODUCT_BASE_URL"))
-
-MONGO_URI = str(config("MONGO_URI"))
-DB_NAME = str(config("DB_NAME"))
-CHUNK_SIZE = int(config("CHUNK_SIZE"))
-PRODUCTS_COLLECTION = str(config("PRODUCTS_COLLECTION"))
-COMMENTS_COLLECTION = str(config("COMMENTS_COLLECTION"))
\ No newline at end of file
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Typed, read-only view of the environment; bad values fail at import."""
+
+    url: str
+    query: str
+    timeout: int
+    enable_logging: bool
+    comments_base_url: str
+    product_base_url: str
+    product_etag_cache: str
+
+    mongo_uri: str
+    db_name: str
+    chunk_size: int
+    products_collection: str
+    comments_collection: str
+    mongo_min_pool_size: int
+    mongo_max_pool_size: int
+    mongo_compressors: str
+    etl_unacknowledged_writes: bool
+
+
+SETTINGS = Settings(
+    url=config("URL"),
+    query=config("QUERY"),
+    timeout=config("TIMEOUT", cast=int),
+    enable_logging=config("ENABLE_LOGGING", cast=bool),
+    comments_base_url=config("COMMENTS_BASE_URL"),
+    product_base_url=config("PRODUCT_BASE_URL"),
+    product_etag_cache=config(
+        "PRODUCT_ETAG_CACHE", default="data/original_data/product_etags.ndjson"
+    ),
+    mongo_uri=config("MONGO_URI"),
+    db_name=config("DB_NAME"),
+    chunk_size=config("CHUNK_SIZE", cast=int),
+    products_collection=config("PRODUCTS_COLLECTION"),
+    comments_collection=config("COMMENTS_COLLECTION"),
+    mongo_min_pool_size=config("MONGO_MIN_POOL_SIZE", default=16, cast=int),
+    mongo_max_pool_size=config("MONGO_MAX_POOL_SIZE", default=64, cast=int),
+    mongo_compressors=config("MONGO_COMPRESSORS", default="zstd,zlib"),
+    etl_unacknowledged_writes=config(
+        "ETL_UNACKNOWLEDGED_WRITES", default=False, cast=bool
+    ),
+)
+
+URL = SETTINGS.url
+QUERY = SETTINGS.query
+TIMEOUT = SETTINGS.timeout
+ENABLE_LOGGING = SETTINGS.enable_logging
+COMMENTS_BASE_URL = SETTINGS.comments_base_url
+PRODUCT_BASE_URL = SETTINGS.product_base_url
+PRODUCT_ETAG_CACHE = SETTINGS.product_etag_cache
+
+MONGO_URI = SETTINGS.mongo_uri
+DB_NAME = SETTINGS.db_name
+CHUNK_SIZE = SETTINGS.chunk_size
+PRODUCTS_COLLECTION = SETTINGS.products_collection
+COMMENTS_COLLECTION = SETTINGS.comments_collection
+MONGO_MIN_POOL_SIZE = SETTINGS.mongo_min_pool_size
+MONGO_MAX_POOL_SIZE = SETTINGS.mongo_max_pool_size
+MONGO_COMPRESSORS = SETTINGS.mongo_compressors
+ETL_UNACKNOWLEDGED_WRITES = SETTINGS.etl_unacknowledged_writes
@@ -1,49 +1,74 @@
 import asyncio
-import json
+import functools
 import os
 from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Tuple
+from itertools import batched
+from typing import Dict, Iterable, Iterator, List
 import logging
 import aiofiles
+import bson
+import ijson
+import orjson
 import motor.motor_asyncio
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
-from pymongo import UpdateOne
+from bson.raw_bson import RawBSONDocument
+from pymongo import UpdateOne, WriteConcern
 from pymongo.errors import BulkWriteError, OperationFailure
 
+from .util.event_loop import loop_factory
 from .util.logger import setup_logger
 from .config import (
     CHUNK_SIZE,
     PRODUCTS_COLLECTION,
     COMMENTS_COLLECTION,
     ENABLE_LOGGING,
+    ETL_UNACKNOWLEDGED_WRITES,
     MONGO_URI,
     DB_NAME,
+    MONGO_COMPRESSORS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
 )
 
 NUM_PROCESSES = os.cpu_count() or 1
+# Unique index of the former (product_id, created_at, body) comment key; it
+# merged distinct comments with the same text and day, so it is dropped
+LEGACY_COMMENT_KEY_INDEX = "product_id_1_created_at_1_body_1"
+# Documents per bulk write, and bulk writes in flight per loaded chunk
+WRITE_BATCH_SIZE = 200
+WRITE_CONCURRENCY = 16
+# Stand-in for missing nested objects, so transforms can chain .get() calls
+_EMPTY: dict = {}
 
 
-if ENABLE_LOGGING:
-    # --- Setup logger ---
-    # Get the current date and time
-    current_time = datetime.now()
+# --- Setup logger ---
+# Handlers are attached lazily, so importing this module has no file side effects
+logger = logging.getLogger("ETL Pipeline")
+
+# Directory of this module, used to place the logs folder
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    # Format the date and time into a string suitable for a filename
-    timestamp = current_time.strftime("%Y-%m-%d_%H-%M-%S")
 
-    # Construct the log filename
-    log_filename = f"logs/ETL_{timestamp}.log"
+@functools.lru_cache(maxsize=None)
+def _setup_logging(pid: int) -> None:
+    """
+    Attach console and file handlers to the ETL logger, once per process.
+
+    The process id is part of the file name, so processes started in the
+    same second do not share a log file.
+    """
+    if not ENABLE_LOGGING:
+        return
 
-    # Get the directory of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+    # Format the date and time into a string suitable for a filename
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     # Define the full path for the log file
-    log_file_path = os.path.join(script_dir, log_filename)
+    log_file_path = os.path.join(_SCRIPT_DIR, "logs", f"ETL_{timestamp}_{pid}.log")
+    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
 
-    logger = setup_logger("ETL Pipeline", log_file_path=log_file_path)
-else:
-    logger = logging.getLogger("ETL Pipeline")
+    setup_logger("ETL Pipeline", log_file_path=log_file_path)
 
 
 def find_latest_file(base_dir: str, file_type: str) -> str | None:
@@ -67,25 +92,19 @@ def find_latest_file(base_dir: str, file_type: str) -> str | None:
         all_files = os.listdir(base_dir)
 
         # Filter for files that match the naming convention
-        # e.g., "2025-08-24_16-36-04_Products.json"
+        # e.g., "Products_2025-08-24_16-36-04.json"
+        prefix = f"{file_type}_"
         matching_files = [
-            f
-            for f in all_files
-            if f.startswith(f"{file_type}_") and f.endswith(".json")
+            f for f in all_files if f.startswith(prefix) and f.endswith(".json")
         ]
 
         if not matching_files:
             logger.warning(f"No files of type '{file_type}' found.")
             return None
 
-        # Sort the files by their timestamp in descending order
-        # The timestamp is the first part of the filename
-        matching_files.sort(
-            key=lambda f: f.split("_")[0] + f.split("_")[1], reverse=True
-        )
-
-        # The first file in the sorted list is the latest
-        latest_file = matching_files[0]
+        # The timestamp after the prefix (YYYY-MM-DD_HH-MM-SS) sorts lexically,
+        # so the latest file is the one with the greatest timestamp
+        latest_file = max(matching_files, key=lambda f: f[len(prefix) : -len(".json")])
 
         logger.info(f"Found latest '{file_type}' file: {latest_file}")
         return os.path.join(base_dir, latest_file)
@@ -95,8 +114,6 @@ def find_latest_file(base_dir: str, file_type: str) -> str | None:
         return None
 
 
-script_dir = os.path.dirname(os.path.abspath(__file__))
-
 
 async def setup_database_schemas(db: motor.motor_asyncio.AsyncIOMotorDatabase):
     """
@@ -167,7 +184,7 @@ async def setup_database_schemas(db: motor.motor_asyncio.AsyncIOMotorDatabase):
                         }
                     },
                 },
-                "popularity": {"bsonType": int, "description": "must be an integer"},
+                "popularity": {"bsonType": "int", "description": "must be an integer"},
                 "num_questions": {
                     "bsonType": "int",
                     "description": "must be a string",
@@ -178,7 +195,7 @@ async def setup_database_schemas(db: motor.motor_asyncio.AsyncIOMotorDatabase):
                 },
                 "suggestions": {
                     "bsonType": "array",
-                    "items": "int",
+                    "items": {"bsonType": "int"},
                     "description": "an array of integers",
                 },
                 "comments_overview": {
@@ -244,256 +261,332 @@ async def setup_database_schemas(db: motor.motor_asyncio.AsyncIOMotorDatabase):
         )
 
 
+# Products missing any of these (or holding None) are skipped; this mirrors the
+# required list of product_validator, which bulk loads bypass
+REQUIRED_PRODUCT_FIELDS = ("id", "title_en", "brand", "category", "specifications")
+
+
+def _product_images(images: dict) -> list[str]:
+    """Main image first, then the gallery, as first-resolution URLs."""
+    main = images.get("main")
+    urls = [main.get("url")[0]] if main is not None else []
+    urls.extend(im.get("url")[0] for im in images.get("list") or ())
+    return urls
+
+
 def transform_products(raw_chunc: list[dict]) -> list[UpdateOne]:
-    def _get_colors(item: list | None) -> list:
-        if item is None:
-            return []
-        else:
-            return [dic["title"] for dic in item]
+    """Synchronous products transformation for a single chunk (picklable result)."""
+    return list(iter_product_ops(raw_chunc))
 
-    def _get_images(item: dict | None) -> list[str]:
-        if item is None:
-            return []
-        images = []
-        try:
-            main = item.get("main")
-            if main is not None:
-                images.append(main.get("url")[0])
-        except KeyError as e:
-            logger.error(f"Error in extracting main image of product {e}")
-        try:
-            ims = item.get("list")
-            if ims is not None:
-                for im in ims:
-                    images.append(im.get("url")[0])
-        except KeyError as e:
-            logger.error(f"Error in extracting images of product {e}")
-        return images
-
-    def _general_get(item, inner_key: str, outer_key: str):
-        if item is None or isinstance(item, list):
-            return None
-        try:
-            value = item.get(outer_key)
-            if value is not None:
-                return value.get(inner_key)
-        except KeyError as e:
-            logger.error(f"Error extracting {outer_key, inner_key} with {e}")
 
+def iter_product_ops(raw_chunc: Iterable[dict]) -> Iterator[UpdateOne]:
+    """Yield one upsert per valid product without building the full list."""
     logger.info("Transforming product data...")
-    operations = []
     for item in raw_chunc:
         doc_id = item.get("id")
 
         # Treat empty dicts/lists as present (e.g., brand={}, specifications={})
         # Only skip when a required value is missing or explicitly None
-        required_present = [
-            doc_id is not None,
-            item.get("title_en") is not None,
-            item.get("brand") is not None,
-            item.get("category") is not None,
-            item.get("specifications") is not None,
-        ]
-        if not all(required_present):
+        if any(item.get(key) is None for key in REQUIRED_PRODUCT_FIELDS):
             logger.warning(
                 f"Skipping product with missing required fields: {doc_id or 'N/A'}"
             )
             continue
 
+        rating = item.get("rating") or _EMPTY
+        variant = item.get("default_variant")
+        # Products without a purchasable variant come back with a list here
+        if not isinstance(variant, dict):
+            variant = _EMPTY
+
         document = {
             "title_fa": item.get("title_fa"),
-            "title_en": item.get("title_en"),
-            "brand": _general_get(item, "code", "brand"),
-            "category": _general_get(item, "code", "category"),
-            "colors": _get_colors(item.get("colors", None)),
-            "specifications": item.get("specifications", []),
-            "rate": _general_get(item, "rate", "rating"),
-            "count_raters": _general_get(item, "count", "rating"),
-            "price": _general_get(
-                item.get("default_variant", None), "selling_price", "price"
-            ),
+            "title_en": item["title_en"],
+            "brand": (item.get("brand") or _EMPTY).get("code"),
+            "category": (item.get("category") or _EMPTY).get("code"),
+            "colors": [color["title"] for color in item.get("colors") or ()],
+            "specifications": item["specifications"],
+            "rate": rating.get("rate"),
+            "count_raters": rating.get("count"),
+            "price": (variant.get("price") or _EMPTY).get("selling_price"),
             "popularity": len(item.get("product_badges", [])),
-            "suggestions": item.get("suggestion", {}),
+            "suggestions": item.get("suggestion"),
             "num_comments": item.get("comments_count", 0),
             "num_questions": item.get("questions_count", 0),
-            "comments_overview": item.get("comments_overview", []),
-            "images": _get_images(item.get("images", None)),
+            "comments_overview": item.get("comments_overview"),
+            "images": _product_images(item.get("images") or _EMPTY),
         }
-        operations.append(UpdateOne({"_id": doc_id}, {"$set": document}, upsert=True))
-    return operations
+        # Missing values are left out of $set instead of being written as null
+        document = {key: value for key, value in document.items() if value is not None}
+        # Encoded to BSON here, in the worker process; the driver copies raw
+        # documents into the update command instead of encoding them again
+        update = RawBSONDocument(bson.encode({"$set": document}))
+        yield UpdateOne({"_id": doc_id}, update, upsert=True)
 
 
-def transform_comments(raw_chunk: list) -> Tuple[List[Dict], List[str]]:
+def transform_comments(raw_chunk: list) -> List[Dict]:
     """Synchronous comments transformation for a single chunk."""
-
-    def _general_get_comment(
-        item, outer_key, inner_key=None
-    ) -> int | str | list | None:
-        if item is None:
-            return None
-        try:
-            outer_value = item.get(outer_key)
-            if outer_value is not None and (inner_key is None):
-                return outer_value
-            elif outer_value is not None and (inner_key is not None):
-                return outer_value.get(inner_key)
-        except KeyError as e:
-            logger.error(f"Error in extracting {outer_key, inner_key} with error {e}")
-
-    def _get_images(item) -> List:
-        if item is not None:
-            images = []
-            for im in item:
-                images.append(im.get("url")[0])
-        else:
-            return []
-        return images
-
-    documents, product_ids = [], set()
+    documents = []
 
     # The raw_chunk is a list of dictionaries, where each dict has product_id and other keys
     for item in raw_chunk:
         product_id = item.get("product_id")
-        if not product_id:
+        # Same required fields as comment_validator, which bulk loads bypass,
+        # plus the API comment id that identifies the comment across runs
+        if not product_id or item.get("body") is None or item.get("id") is None:
             continue
 
-        product_ids.add(product_id)
-
         # Create a new document for the comment
+        purchased_item = item.get("purchased_item") or _EMPTY
+        reactions = item.get("reactions") or _EMPTY
         comment_doc = {
-            # _id; store product_id explicitly
+            "_id": item["id"],
             "product_id": product_id,
-            "title": _general_get_comment(item, "title"),
-            "body": _general_get_comment(item, "body"),
-            "rate": _general_get_comment(item, "rate"),
-            "advantages": _general_get_comment(item, "advantages"),
-            "disadvantages": _general_get_comment(item, "disadvantages"),
-            "is_buyer": _general_get_comment(item, "is_buyer"),
-            "created_at": _general_get_comment(item, "created_at"),
-            "color": _general_get_comment(
-                _general_get_comment(item, "purchased_item"), "color", "title"
-            ),
-            "seller": _general_get_comment(
-                _general_get_comment(item, "purchased_item"), "seller", "title"
-            ),
-            "likes": _general_get_comment(item, "reactions", "likes"),
-            "dislikes": _general_get_comment(item, "reactions", "dislikes"),
-            "images": _get_images(_general_get_comment(item, "files")),
+            "title": item.get("title"),
+            "body": item["body"],
+            "rate": item.get("rate"),
+            "advantages": item.get("advantages"),
+            "disadvantages": item.get("disadvantages"),
+            "is_buyer": item.get("is_buyer"),
+            "created_at": item.get("created_at"),
+            "color": (purchased_item.get("color") or _EMPTY).get("title"),
+            "seller": (purchased_item.get("seller") or _EMPTY).get("title"),
+            "likes": reactions.get("likes"),
+            "dislikes": reactions.get("dislikes"),
+            "images": [im.get("url")[0] for im in item.get("files") or ()],
         }
         documents.append(comment_doc)
 
-    return documents, list(product_ids)
+    return documents
 
 
 # --- Asynchronous I/O and Orchestrating Functions ---
 async def extract_product_in_chunks(file_path: str):
-    """Asynchronously extracts data from a file and yields it in chunks."""
+    """
+    Asynchronously stream products from a file and yield them in chunks.
+
+    The file is parsed incrementally, so memory holds one brand's products
+    and the current chunk rather than the whole file.
+    """
     logger.info(f"Starting async chunked extraction from {file_path}...")
     try:
-        async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-            content = await f.read()
-            raw_data = json.loads(content)
-
-            # This logic flattens the nested dictionary into a list of documents
-            flat_list = []
-            for product in raw_data:
-                for _, product_list in product.items():
-                    for item in product_list:
-                        flat_list.append(item)
-
-            logger.info(f"Flattened {len(flat_list)} total products.")
-
-            for i in range(0, len(flat_list), CHUNK_SIZE):
-                yield flat_list[i : i + CHUNK_SIZE]
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        async with aiofiles.open(file_path, "rb") as f:
+            chunk, total = [], 0
+            # Each top-level item maps a brand id to its list of products
+            async for _, product_list in ijson.kvitems(f, "item", use_float=True):
+                for item in product_list:
+                    chunk.append(item)
+                    if len(chunk) == CHUNK_SIZE:
+                        yield chunk
+                        chunk = []
+                total += len(product_list)
+
+            if chunk:
+                yield chunk
+            logger.info(f"Extracted {total} total products.")
+    except (FileNotFoundError, ijson.JSONError) as e:
         logger.error(f"Failed to extract data: {e}")
         return
 
 
 async def extract_comments_in_chunks(file_path: str):
     """
-    Asynchronously extracts comments from a file and yields it in chunks.
+    Asynchronously stream comments from a file and yield them in chunks.
     This version handles the dictionary-of-lists structure of the comments JSON.
     """
     logger.info(f"Starting async chunked extraction from {file_path}...")
     try:
-        async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-            content = await f.read()
-            raw_data = json.loads(content)
-
-            # The JSON is a dictionary with numeric string keys
-            # and each value is a list of comment dicts.
-
-            flat_list = []
+        async with aiofiles.open(file_path, "rb") as f:
+            chunk, total = [], 0
             # comments structure are list of dict and each dict have key and its value
             # that is a list of list and each inner list
             # contains comments of a product
-            for brand in raw_data:
-                for brand_key, brand_comments in brand.items():
-                    for cl in brand_comments:
-                        # use logical AND, and ensure we only extend with iterables
-                        if isinstance(cl, list) and cl is not None:
-                            flat_list.extend(cl)
-                        else:
-                            logger.warning(
-                                f"Unexpected data type for key {brand_key}: {type(cl)}"
-                            )
-
-            logger.info(f"Flattened {len(flat_list)} total comments.")
-
-            # Now, yield chunks from the flattened list
-            for i in range(0, len(flat_list), CHUNK_SIZE):
-                yield flat_list[i : i + CHUNK_SIZE]
-
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+            async for brand_key, brand_comments in ijson.kvitems(
+                f, "item", use_float=True
+            ):
+                for cl in brand_comments:
+                    # use logical AND, and ensure we only extend with iterables
+                    if not (isinstance(cl, list) and cl is not None):
+                        logger.warning(
+                            f"Unexpected data type for key {brand_key}: {type(cl)}"
+                        )
+                        continue
+                    for comment in cl:
+                        chunk.append(comment)
+                        if len(chunk) == CHUNK_SIZE:
+                            yield chunk
+                            chunk = []
+                    total += len(cl)
+
+            if chunk:
+                yield chunk
+            logger.info(f"Extracted {total} total comments.")
+
+    except (FileNotFoundError, ijson.JSONError) as e:
         logger.error(f"Failed to extract data: {e}")
         return
 
 
+async def _write_in_batches(write, items: Iterable) -> list:
+    """
+    Call write on fixed-size batches of items, a bounded number at a time.
+
+    Returns one result per batch; a failed batch yields its exception.
+    """
+    semaphore = asyncio.Semaphore(WRITE_CONCURRENCY)
+
+    async def _write_batch(batch: tuple) -> object:
+        async with semaphore:
+            return await write(list(batch))
+
+    return await asyncio.gather(
+        *(_write_batch(batch) for batch in batched(items, WRITE_BATCH_SIZE)),
+        return_exceptions=True,
+    )
+
+
 async def load_products(
-    collection: AsyncIOMotorCollection, operations: list[UpdateOne]
+    collection: AsyncIOMotorCollection, operations: Iterable[UpdateOne]
+) -> int:
+    logger.info("Loading product operations into DB...")
+    if ETL_UNACKNOWLEDGED_WRITES:
+        return await _load_products_unacknowledged(collection, operations)
+
+    results = await _write_in_batches(
+        lambda batch: collection.bulk_write(
+            batch, ordered=False, bypass_document_validation=True
+        ),
+        operations,
+    )
+
+    upserted = modified = 0
+    for result in results:
+        if isinstance(result, BulkWriteError):
+            # Unordered batches keep the writes that succeeded
+            logger.error(f"Load failed: {result}", exc_info=result)
+            upserted += result.details.get("nUpserted", 0)
+            modified += result.details.get("nModified", 0)
+        elif isinstance(result, Exception):
+            logger.error(f"Load failed: {result}", exc_info=result)
+        else:
+            upserted += result.upserted_count
+            modified += result.modified_count
+
+    logger.info(f"✅Load complete. Upserted: {upserted}, Modified: {modified}.")
+    return upserted + modified
+
+
+async def _load_products_unacknowledged(
+    collection: AsyncIOMotorCollection, operations: Iterable[UpdateOne]
 ) -> int:
-    logger.info(f"Loading {len(operations)} product operations into DB...")
+    """
+    Fire-and-forget (w=0) variant of load_products for bulk backfills.
+
+    The server does not report results, so the number of operations sent is
+    returned and write errors go unnoticed. Validation is not bypassed, since
+    the driver does not allow that for unacknowledged writes.
+    """
+    unacknowledged = collection.with_options(write_concern=WriteConcern(w=0))
+
+    async def _write(batch: list) -> int:
+        await unacknowledged.bulk_write(batch, ordered=False)
+        return len(batch)
+
+    sent = 0
+    for result in await _write_in_batches(_write, operations):
+        if isinstance(result, Exception):
+            logger.error(f"Load failed: {result}", exc_info=result)
+        else:
+            sent += result
+
+    logger.info(f"✅Load complete. Sent {sent} unacknowledged upserts.")
+    return sent
+
+
+async def ensure_comments_index(collection: AsyncIOMotorCollection) -> None:
+    """
+    Index comments by product and drop the legacy unique comment-key index.
+
+    Comments are upserted by their API id (_id); the product_id index serves
+    the per-product cleanup of comments stored before that in load_comments.
+    Failures are logged, since loading works without either change.
+    """
     try:
-        result = await collection.bulk_write(operations, ordered=False)
-        count = result.upserted_count + result.modified_count
-        logger.info(
-            f"✅Load complete. Upserted: {result.upserted_count}, Modified: {result.modified_count}."
-        )
-        return count
-    except (BulkWriteError, Exception) as e:
-        logger.error(f"Load failed: {e}", exc_info=True)
-        return 0
+        await collection.drop_index(LEGACY_COMMENT_KEY_INDEX)
+    except OperationFailure:
+        pass  # never created, or already dropped
+    try:
+        await collection.create_index("product_id")
+    except OperationFailure as e:
+        logger.warning(f"Could not create the comments product_id index: {e}")
 
 
 async def load_comments(
-    collection: AsyncIOMotorCollection, transformed_data: tuple[list[dict], list[str]]
+    collection: AsyncIOMotorCollection, documents: list[dict]
 ) -> int:
-    documents, product_ids = transformed_data
     if not documents:
         return 0
 
-    logger.info(f"Deleting old comments for {len(product_ids)} products...")
-    await collection.delete_many({"product_id": {"$in": product_ids}})
-
-    logger.info(f"Inserting {len(documents)} new comments...")
+    # Comments stored before they were keyed by API id have generated ObjectId
+    # ids; drop those of this chunk's products, they are upserted again below
+    product_ids = list({doc["product_id"] for doc in documents})
     try:
-        result = await collection.insert_many(documents, ordered=False)
-        count = len(result.inserted_ids)
-        logger.info(f"✅Inserted {count} new comments.")
-        return count
-    except (BulkWriteError, Exception) as e:
-        logger.error(f"Load failed: {e}", exc_info=True)
-        return 0
+        await collection.delete_many(
+            {"product_id": {"$in": product_ids}, "_id": {"$type": "objectId"}}
+        )
+    except Exception as e:
+        logger.error(f"Removing legacy comments failed: {e}", exc_info=e)
+
+    # Upsert each comment by its API id, so re-runs replace comments in place
+    operations = [
+        UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {key: value for key, value in doc.items() if key != "_id"}},
+            upsert=True,
+        )
+        for doc in documents
+    ]
+
+    logger.info(f"Upserting {len(operations)} comments...")
+    results = await _write_in_batches(
+        lambda batch: collection.bulk_write(
+            batch, ordered=False, bypass_document_validation=True
+        ),
+        operations,
+    )
+
+    upserted = modified = 0
+    for result in results:
+        if isinstance(result, BulkWriteError):
+            logger.error(f"Load failed: {result}", exc_info=result)
+            upserted += result.details.get("nUpserted", 0)
+            modified += result.details.get("nModified", 0)
+        elif isinstance(result, Exception):
+            logger.error(f"Load failed: {result}", exc_info=result)
+        else:
+            upserted += result.upserted_count
+            modified += result.modified_count
+
+    logger.info(f"✅Comments loaded. Upserted: {upserted}, Modified: {modified}.")
+    return upserted + modified
+
+
+def _transform_encoded(transform_func, encoded_chunk: bytes):
+    """Decode an orjson-encoded chunk in the worker process and transform it."""
+    return transform_func(orjson.loads(encoded_chunk))
 
 
 async def _process_chunk_async(chunk, transform_func, load_func, collection, executor):
     """
     An asynchronous worker task to handle a single chunk's transformation and loading.
     """
-    # 1. Transform the chunk in a separate process (CPU-bound)
+    # 1. Transform the chunk in a separate process (CPU-bound). The chunk crosses
+    # the process boundary as one orjson blob, which pickles far faster than a
+    # list of nested dicts
     loop = asyncio.get_running_loop()
-    transformed_chunk = await loop.run_in_executor(executor, transform_func, chunk)
+    transformed_chunk = await loop.run_in_executor(
+        executor, _transform_encoded, transform_func, orjson.dumps(chunk)
+    )
 
     # 2. Load the transformed chunk asynchronously (I/O-bound)
     loaded_count = await load_func(collection, transformed_chunk)
@@ -524,29 +617,69 @@ async def run_chunked_pipeline_concurrently(
         logger.error("Chunk generator could not be created.")
         return None
 
-    tasks = []
-    async for chunk in chunk_generator:
-        task = asyncio.create_task(
-            _process_chunk_async(chunk, transform_func, load_func, collection, executor)
-        )
-        tasks.append(task)
+    # Bounded, so extraction pauses while the workers are busy and only a few
+    # chunks are held in memory at any time
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=2 * NUM_PROCESSES)
+    total_loaded = 0
 
-    results = await asyncio.gather(*tasks)
+    async def produce() -> None:
+        try:
+            async for chunk in chunk_generator:
+                await chunks.put(chunk)
+        finally:
+            # Workers finish the queued chunks, then get() raises QueueShutDown
+            chunks.shutdown()
+
+    async def consume() -> None:
+        nonlocal total_loaded
+        while True:
+            try:
+                chunk = await chunks.get()
+            except asyncio.QueueShutDown:
+                return
+            try:
+                total_loaded += await _process_chunk_async(
+                    chunk, transform_func, load_func, collection, executor
+                )
+            except Exception as e:
+                logger.error(f"Failed to process a chunk: {e}", exc_info=True)
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(produce())
+        for _ in range(NUM_PROCESSES):
+            tg.create_task(consume())
 
-    total_loaded = sum(results)
     logger.info(f"Total documents loaded for {collection.name}: {total_loaded}")
     return total_loaded
 
 
+def build_mongo_client(mongo_uri: str) -> AsyncIOMotorClient:
+    """
+    Create the Motor client used by an ETL run.
+
+    The pool is sized for the concurrent bulk writes, and wire compression
+    shrinks the large specification documents sent in each batch. One client
+    is built per run because Motor clients are bound to the running loop.
+    """
+    return AsyncIOMotorClient(
+        mongo_uri,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        maxIdleTimeMS=60000,
+        compressors=MONGO_COMPRESSORS,
+    )
+
+
 # --- Separate ETL Functions ---
 async def run_products_etl(
     mongo_uri: str, product_path: str, db_name: str, products_collection: str
 ):
     """Runs ETL pipeline for products only."""
+    _setup_logging(os.getpid())
     executor = ProcessPoolExecutor(max_workers=NUM_PROCESSES)
     client = None
     try:
-        client = AsyncIOMotorClient(mongo_uri)
+        client = build_mongo_client(mongo_uri)
         db = client[db_name]
         products_collection = db[products_collection]  # pyright: ignore
 
@@ -573,12 +706,14 @@ async def run_comments_etl(
     mongo_uri: str, comments_path: str, db_name: str, comments_collection: str
 ):
     """Runs ETL pipeline for comments only."""
+    _setup_logging(os.getpid())
     executor = ProcessPoolExecutor(max_workers=NUM_PROCESSES)
     client = None
     try:
-        client = AsyncIOMotorClient(mongo_uri)
+        client = build_mongo_client(mongo_uri)
         db = client[db_name]
         comments_collection = db[comments_collection]  # pyright: ignore
+        await ensure_comments_index(comments_collection)
         await run_chunked_pipeline_concurrently(
             comments_path,
             comments_collection,
@@ -601,6 +736,7 @@ async def run_comments_etl(
 # --- Main Orchestrator / Example Usage---
 async def main():
     """Initializes and runs the ETL pipelines concurrently."""
+    _setup_logging(os.getpid())
     executor = ProcessPoolExecutor(max_workers=NUM_PROCESSES)
     client = None
     try:
@@ -615,7 +751,7 @@ async def main():
         # if not comments_path:
         #     logger.error("No comments file found. Ensure the extractor has generated *_comments.json.")
         print(MONGO_URI)
-        client = AsyncIOMotorClient(MONGO_URI)
+        client = build_mongo_client(MONGO_URI)
         db = client[DB_NAME]
         products_collection = db[PRODUCTS_COLLECTION]
         # comments_collection = db[COMMENTS_COLLECTION]
@@ -657,4 +793,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=loop_factory)
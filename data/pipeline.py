@@ -1,10 +1,12 @@
 import asyncio
-import json
+import functools
 import os
 from datetime import datetime
 import argparse
 import logging
 
+import orjson
+
 # --- PREFECT IMPORTS ---
 from prefect import flow, task
 # REMOVED: from prefect.schedules import Schedule, Interval (Not used in Prefect 3.x)
@@ -18,28 +20,34 @@ from .config import (
     TIMEOUT,
     ENABLE_LOGGING,
     PRODUCT_BASE_URL,
+    PRODUCT_ETAG_CACHE,
     COMMENTS_BASE_URL,
     COMMENTS_COLLECTION,
     DB_NAME,
     MONGO_URI,
     PRODUCTS_COLLECTION,
 )
+from .util.event_loop import loop_factory
 from .util.logger import setup_logger
 from .etl import run_products_etl, run_comments_etl
 
 
 # --- LOGGING SETUP ---
-if ENABLE_LOGGING:
-    current_time = datetime.now()
-    timestamp = current_time.strftime("%Y-%m-%d_%H-%M-%S")
-    log_filename = f"logs/Pipeline_{timestamp}.log"
+# Handlers are attached lazily, so importing this module has no file side effects
+logger = logging.getLogger("Pipeline")
+
+
+@functools.lru_cache(maxsize=None)
+def _setup_logging() -> None:
+    """Attach console and file handlers to the pipeline logger, once per process."""
+    if not ENABLE_LOGGING:
+        return
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    log_file_path = os.path.join(script_dir, log_filename)
+    log_file_path = os.path.join(script_dir, "logs", f"Pipeline_{timestamp}.log")
     # Ensure logs directory exists
     os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
-    logger = setup_logger("Pipeline", log_file_path=log_file_path)
-else:
-    logger = logging.getLogger("Pipeline")
+    setup_logger("Pipeline", log_file_path=log_file_path)
 
 
 def ensure_dirs() -> str:
@@ -53,9 +61,11 @@ def ensure_dirs() -> str:
 
 
 async def run_brand_extraction(timeout: int, url: str, query: str) -> dict:
-    extractor = BrandExtractor(base_url=url, query=query, timeout=timeout)
     try:
-        return await extractor.get_all_ids_by_brand()
+        async with BrandExtractor(
+            base_url=url, query=query, timeout=timeout
+        ) as extractor:
+            return await extractor.get_all_ids_by_brand()
     except Exception as e:
         logger.error(f"Error in run_brand_extraction: {e}")
         raise
@@ -67,23 +77,54 @@ async def run_product_extractor(
     brands_info: dict,
     state: str = "",
     comments_base_url: str = "",
+    etag_cache_path: str = "",
 ) -> tuple[list[dict], list[dict]]:
-    extractor = ProductExtractor(
-        base_url=products_base_url,
-        timeout=timeout,
-        state=state,
-        comments_base_url=comments_base_url,
-    )
     try:
-        return await extractor.run(brands_info=brands_info)
+        async with ProductExtractor(
+            base_url=products_base_url,
+            timeout=timeout,
+            state=state,
+            comments_base_url=comments_base_url,
+            etag_cache_path=etag_cache_path,
+        ) as extractor:
+            return await extractor.run(brands_info=brands_info)
     except Exception as e:
         logger.error(f"Error in run_product_extractor: {e}")
         raise
 
 
+async def stream_product_extractor(
+    products_base_url: str,
+    timeout: int,
+    brands_info: dict,
+    out_path: str,
+    state: str = "",
+    comments_base_url: str = "",
+    etag_cache_path: str = "",
+) -> int:
+    """Write each brand to out_path as it finishes; returns the brands written."""
+    try:
+        async with ProductExtractor(
+            base_url=products_base_url,
+            timeout=timeout,
+            state=state,
+            comments_base_url=comments_base_url,
+            etag_cache_path=etag_cache_path,
+        ) as extractor:
+            return await extractor.save_stream(
+                extractor.iter_brand_results(brands_info), out_path
+            )
+    except Exception as e:
+        logger.error(f"Error in stream_product_extractor: {e}")
+        raise
+
+
 def save_json(obj, path: str):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False)
+    # orjson writes UTF-8 bytes directly; integer brand ids become string keys
+    with open(path, "wb") as f:
+        f.write(
+            orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        )
         logger.info(f"Saved JSON data to {path}")
 
 
@@ -92,25 +133,27 @@ def save_json(obj, path: str):
 
 async def products_main():
     """Manual execution logic without Prefect tasks (optional, strictly for manual debugging)"""
+    _setup_logging()
     out_dir = ensure_dirs()
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     # 1) Brand IDs
-    brands_info = await run_brand_extraction(timeout=TIMEOUT, url=str(URL), query=QUERY)
+    brands_info = await run_brand_extraction(timeout=TIMEOUT, url=URL, query=QUERY)
     brands_path = os.path.join(out_dir, f"brands_info_{current_time}.json")
     save_json(brands_info, brands_path)
     logger.info(f"Saved brands info to {brands_path}")
 
-    # 2) Products
-    products = await run_product_extractor(
+    # 2) Products, written brand by brand instead of collected in memory
+    products_path = os.path.join(out_dir, f"Products_{current_time}.json")
+    count = await stream_product_extractor(
         products_base_url=PRODUCT_BASE_URL,
         timeout=TIMEOUT,
         brands_info=brands_info,
+        out_path=products_path,
         state="Products",
+        etag_cache_path=PRODUCT_ETAG_CACHE,
     )
-    products_path = os.path.join(out_dir, f"Products_{current_time}.json")
-    save_json(products, products_path)
-    logger.info(f"Saved products info to {products_path}")
+    logger.info(f"Saved products of {count} brands to {products_path}")
 
     # ETL
     return await run_products_etl(
@@ -123,22 +166,23 @@ async def products_main():
 
 async def comments_main():
     """Manual execution logic for comments"""
+    _setup_logging()
     out_dir = ensure_dirs()
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
-    brands_info = await run_brand_extraction(timeout=TIMEOUT, url=str(URL), query=QUERY)
+    brands_info = await run_brand_extraction(timeout=TIMEOUT, url=URL, query=QUERY)
     brands_path = os.path.join(out_dir, f"brands_info_{current_time}.json")
     save_json(brands_info, brands_path)
 
-    comments = await run_product_extractor(
+    comments_path = os.path.join(out_dir, f"Comments_{current_time}.json")
+    await stream_product_extractor(
         products_base_url=PRODUCT_BASE_URL,
         timeout=TIMEOUT,
         brands_info=brands_info,
+        out_path=comments_path,
         state="Comments",
         comments_base_url=COMMENTS_BASE_URL,
     )
-    comments_path = os.path.join(out_dir, f"Comments_{current_time}.json")
-    save_json(comments, comments_path)
 
     return await run_comments_etl(
         mongo_uri=MONGO_URI,
@@ -153,16 +197,19 @@ async def comments_main():
 
 @task
 async def extract_brands_task():
-    return await run_brand_extraction(timeout=TIMEOUT, url=str(URL), query=QUERY)
+    return await run_brand_extraction(timeout=TIMEOUT, url=URL, query=QUERY)
 
 
 @task
-async def extract_products_task(brands_info: dict):
-    return await run_product_extractor(
+async def extract_products_task(brands_info: dict, products_path: str) -> int:
+    # Products go straight to disk, so the task result is only the brand count
+    return await stream_product_extractor(
         products_base_url=PRODUCT_BASE_URL,
         timeout=TIMEOUT,
         brands_info=brands_info,
+        out_path=products_path,
         state="Products",
+        etag_cache_path=PRODUCT_ETAG_CACHE,
     )
 
 
@@ -188,6 +235,7 @@ async def products_pipeline_flow():
     """
     Prefect flow for the products ETL pipeline.
     """
+    _setup_logging()
     out_dir = ensure_dirs()
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
@@ -198,10 +246,9 @@ async def products_pipeline_flow():
     logger.info(f"Saved brands info to {brands_path}")
 
     # 2) Products
-    products = await extract_products_task(brands_info)
     products_path = os.path.join(out_dir, f"Products_{current_time}.json")
-    await save_json_task(products, products_path)
-    logger.info(f"Saved products info to {products_path}")
+    count = await extract_products_task(brands_info, products_path)
+    logger.info(f"Saved products of {count} brands to {products_path}")
 
     # ETL
     await run_etl_task(
@@ -229,9 +276,9 @@ def main(argv=None):
     args = parser.parse_args(argv)
 
     if args.stage == "Products":
-        asyncio.run(products_main())
+        asyncio.run(products_main(), loop_factory=loop_factory)
     elif args.stage == "Comments":
-        asyncio.run(comments_main())
+        asyncio.run(comments_main(), loop_factory=loop_factory)
     elif args.stage == "serve":
         # PREFECT 3.X SCHEDULING LOGIC
         # We call .serve() on the flow function itself.
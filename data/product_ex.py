@@ -12,40 +12,104 @@ The module supports two main modes:
 """
 
 import asyncio
-import json
+import errno
+import functools
 import os
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import aiofiles
-from httpx import AsyncClient
-from .config import ENABLE_LOGGING, COMMENTS_BASE_URL, PRODUCT_BASE_URL
+import ijson
+import orjson
+from httpx import Response
+from .config import (
+    ENABLE_LOGGING,
+    COMMENTS_BASE_URL,
+    PRODUCT_BASE_URL,
+    PRODUCT_ETAG_CACHE,
+)
+from .util.async_stream import AsyncByteStream
 from .util.async_timer import async_time
+from .util.event_loop import loop_factory
+from .util.http_client import (
+    build_client,
+    raise_for_retryable_status,
+    retry_budget,
+    retry_transient,
+)
 from .util.logger import setup_logger
 import logging
 
-if ENABLE_LOGGING:
-    # Get the current date and time for log file naming
-    current_time = datetime.now()
+### Setup logger
+# Handlers are attached lazily, so importing this module has no file side effects
+logger = logging.getLogger("Product_Extractor")
+
+
+@functools.lru_cache(maxsize=None)
+def _setup_logging() -> None:
+    """
+    Attach console and file handlers to the module logger, once per process.
+    """
+    if not ENABLE_LOGGING:
+        return
 
     # Format the date and time into a string suitable for a filename
     # Format: YYYY-MM-DD_HH-MM-SS
-    timestamp = current_time.strftime("%Y-%m-%d_%H-%M-%S")
-
-    # Construct the log filename with timestamp to avoid conflicts
-    # Note: There's a typo in the original filename "prduct_ex" instead of "product_ex"
-    log_filename = f"logs/prduct_ex_{timestamp}.log"
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     # Get the directory of the current script for relative path resolution
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    # Define the full path for the log file
-    log_file_path = os.path.join(script_dir, log_filename)
+    # Construct the log file path with timestamp to avoid conflicts
+    log_file_path = os.path.join(script_dir, "logs", f"product_ex_{timestamp}.log")
+    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
 
     # Initialize logger with module name and file path
-    logger = setup_logger("Product_Extractor", log_file_path=log_file_path)
-else:
-    logger = logging.getLogger("Test")
+    setup_logger("Product_Extractor", log_file_path=log_file_path)
+
+
+# Brand ids may be ints; json.dumps turned them into string keys, orjson needs the flag
+_SAVE_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# The ETag cache is compacted on open once it is this many times the size of
+# its latest records, i.e. when replaced records dominate
+ETAG_CACHE_COMPACT_RATIO = 2
+
+# Comment pages queued together with page 1, before the page count is known
+SPECULATIVE_COMMENT_PAGES = 4
+
+# Recent products kept for duplicate ids; bounds memory on long runs
+PRODUCT_CACHE_SIZE = 4096
+
+# Bodies above this size are parsed in a worker thread instead of on the loop
+THREAD_PARSE_THRESHOLD = 64 * 1024
+
+
+async def _parse_json(body: bytes) -> Any:
+    """
+    Parse a response body, off the event loop when it is large.
+
+    Small bodies are parsed inline because a thread hand-off costs more than
+    the parse itself.
+    """
+    if len(body) > THREAD_PARSE_THRESHOLD:
+        return await asyncio.to_thread(orjson.loads, body)
+    return orjson.loads(body)
 
 
 class ProductExtractor:
@@ -61,10 +125,11 @@ class ProductExtractor:
         self,
         base_url: str,
         timeout: int,
-        concurrency: int = 5,
+        concurrency: int = 16,
         logger_instance=logger,
         comments_base_url: str = "",
         state: str = "",
+        etag_cache_path: str = "",
     ):
         """
         Initialize the ProductExtractor with API configuration.
@@ -72,26 +137,260 @@ class ProductExtractor:
         Args:
             base_url (str): Base URL for the Digikala product API endpoint
             timeout (int): Timeout in seconds for HTTP requests
-            concurrency (int): Maximum number of concurrent requests (default: 5)
+            concurrency (int): Maximum number of concurrent requests (default: 16)
             client (Optional[Async Client]): Custom HTTP client instance
             logger_instance: Logger instance for logging operations
             comments_base_url (str): Base URL for comments API endpoint
+            etag_cache_path (str): Optional append-only file of product ETags;
+                products unchanged since an earlier run are answered with 304
+                and read back from it
         """
+        _setup_logging()
         self.base_url = base_url
         self.timeout = timeout
-        # Create semaphore to limit concurrent requests
-        self.semaphore = asyncio.Semaphore(concurrency)
-        # Use provided client or create default one with Firefox impersonation
-        self.client = AsyncClient(timeout=timeout, follow_redirects=True)
+        # Outer bound on one fanned-out call, leaving room for every retry
+        # attempt and the waits between them
+        self.call_timeout = retry_budget(timeout)
+        self.concurrency = concurrency
+        # Counter guarded by a condition limits concurrent requests; unlike a
+        # Semaphore the limit can be changed while requests are in flight
+        self._active = 0
+        self._limit = concurrency
+        self._cv = asyncio.Condition()
+        # Same client settings as the brand extractor (HTTP/2, pool, connect retries)
+        self.client = build_client(timeout)
         self.logger = logger_instance
         self.comments_base_url = comments_base_url
         self.state = state
+        # Recent product fetches by id, shared by duplicate ids across brands
+        self._products: OrderedDict[str, asyncio.Future] = OrderedDict()
+        self.etag_cache_path = etag_cache_path
+        # product id -> (etag, offset, length) of its record in the cache file;
+        # the products themselves stay on disk until a 304 needs one
+        self._etags: Dict[str, Tuple[str, int, int]] = {}
+        self._etag_fd: Optional[int] = None
+        self._etag_end = 0
+        self._etag_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "ProductExtractor":
+        if self.etag_cache_path:
+            await asyncio.to_thread(self._open_etag_cache)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        # Release the pooled connections when the extraction is finished
+        await self.client.aclose()
+        if self._etag_fd is not None:
+            os.close(self._etag_fd)
+            self._etag_fd = None
+
+    def _open_etag_cache(self) -> None:
+        """
+        Open the append-only ETag cache and index the records of earlier runs.
+
+        Each line is a JSON array [product_id, etag, product]; a later line for
+        the same id replaces an earlier one. A last line cut short by a crash
+        is truncated away so new records start on a fresh line. When replaced
+        records make up most of the file, it is compacted first.
+        """
+        self._etag_fd = os.open(
+            self.etag_cache_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644
+        )
+        offset = 0
+        with open(self._etag_fd, "rb", closefd=False) as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    os.ftruncate(self._etag_fd, offset)
+                    break
+                try:
+                    product_id, etag, _ = orjson.loads(line)
+                    self._etags[str(product_id)] = (etag, offset, len(line))
+                except (ValueError, TypeError):
+                    self.logger.warning(f"Skipping unreadable ETag record at {offset}")
+                offset += len(line)
+        self._etag_end = offset
+
+        live = sum(length for _, _, length in self._etags.values())
+        if self._etag_end > ETAG_CACHE_COMPACT_RATIO * live:
+            self._compact_etag_cache()
+
+    def _compact_etag_cache(self) -> None:
+        """Rewrite the ETag cache with only the latest record of each product."""
+        compacted: Dict[str, Tuple[str, int, int]] = {}
+        offset = 0
+        tmp_path = f"{self.etag_cache_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for product_id, (etag, old_offset, length) in self._etags.items():
+                f.write(os.pread(self._etag_fd, length, old_offset))
+                compacted[product_id] = (etag, offset, length)
+                offset += length
+        os.replace(tmp_path, self.etag_cache_path)
+        os.close(self._etag_fd)
+        self._etag_fd = os.open(self.etag_cache_path, os.O_RDWR | os.O_APPEND)
+        self.logger.info(
+            f"Compacted ETag cache from {self._etag_end} to {offset} bytes"
+        )
+        self._etags = compacted
+        self._etag_end = offset
+
+    def _read_cached_product(self, offset: int, length: int) -> dict:
+        """Read one cached product back from the ETag cache file."""
+        return orjson.loads(os.pread(self._etag_fd, length, offset))[2]
+
+    async def _append_etag(self, product_id: str, etag: str, product: dict) -> None:
+        """Append a product to the ETag cache, so it survives a crash mid-run."""
+        line = orjson.dumps(
+            [product_id, etag, product], option=orjson.OPT_APPEND_NEWLINE
+        )
+        # One write at a time, so each record lands at _etag_end; the index
+        # entry is added only once the record can be read back
+        async with self._etag_lock:
+            await asyncio.to_thread(os.write, self._etag_fd, line)
+            self._etags[product_id] = (etag, self._etag_end, len(line))
+            self._etag_end += len(line)
+
+    @asynccontextmanager
+    async def _request_slot(self) -> AsyncIterator[None]:
+        """Hold one of the `_limit` request slots for the duration of the block."""
+        async with self._cv:
+            await self._cv.wait_for(lambda: self._active < self._limit)
+            self._active += 1
+        try:
+            yield
+        finally:
+            async with self._cv:
+                self._active -= 1
+                self._cv.notify(1)
+
+    async def set_concurrency(self, limit: int) -> None:
+        """
+        Change the number of concurrent requests while the extractor is running.
+
+        Requests already in flight are not interrupted; a lower limit takes
+        effect as they finish.
+
+        Args:
+            limit (int): New maximum number of concurrent requests (at least 1)
+        """
+        async with self._cv:
+            self._limit = max(1, limit)
+            self._cv.notify_all()
+
+    async def _back_off_if_out_of_files(self, error: BaseException) -> None:
+        """Halve the request limit when a request failed with EMFILE."""
+        while error is not None:
+            if isinstance(error, OSError) and error.errno == errno.EMFILE:
+                await self.set_concurrency(self._limit // 2)
+                self.logger.warning(
+                    f"Too many open files, request limit lowered to {self._limit}"
+                )
+                return
+            # httpx wraps the socket error, so follow the exception chain
+            error = error.__cause__ or error.__context__
+
+    @retry_transient
+    async def _get(self, url: str, **kwargs) -> Response:
+        """
+        GET within the request limit, retrying connection errors and
+        RETRY_STATUS_CODES with backoff; the last error is raised.
+
+        Args:
+            url (str): URL to request
+            **kwargs: Extra arguments for AsyncClient.get (e.g. headers)
+
+        Returns:
+            Response: The (non-streamed) response
+        """
+        async with self._request_slot():
+            try:
+                res = await self.client.get(url=url, timeout=self.timeout, **kwargs)
+                raise_for_retryable_status(res)
+                return res
+            except Exception as e:
+                await self._back_off_if_out_of_files(e)
+                raise
+
+    async def _fan_out(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        args_list: Iterable[tuple],
+        timeout: Optional[float],
+    ) -> List[Any]:
+        """
+        Run func(*args) for every args tuple with at most `concurrency` tasks alive.
+
+        The slot is acquired before the task is created, so a brand with
+        thousands of products never holds more than `concurrency` pending tasks.
+        Failures and None results are dropped.
 
-    @async_time()
+        Args:
+            func (Callable[..., Awaitable[Any]]): Coroutine function to run
+            args_list (Iterable[tuple]): Positional arguments for each call
+            timeout (Optional[float]): Bound on each call, None for no bound
+
+        Returns:
+            List[Any]: Non-None results in the order of args_list
+        """
+        # A local limiter, the request semaphore is taken inside func itself
+        limiter = asyncio.Semaphore(self.concurrency)
+        # One slot per call, filled by position so the output keeps input order
+        results: List[Any] = []
+
+        async def run_one(index: int, args: tuple) -> None:
+            try:
+                results[index] = await asyncio.wait_for(func(*args), timeout)
+            except Exception as e:
+                self.logger.error(f"Found error {e!r} when processing {args[0]}")
+
+        async with asyncio.TaskGroup() as tg:
+            for index, args in enumerate(args_list):
+                await limiter.acquire()
+                results.append(None)
+                task = tg.create_task(run_one(index, args))
+                task.add_done_callback(lambda _: limiter.release())
+        return [item for item in results if item is not None]
+
+    @async_time(logger)
     async def fetch_product(self, product_id: Union[int, str]) -> Optional[dict]:
         """
         Fetch detailed product information for a single product.
 
+        A product listed under several brands is requested once: concurrent
+        and recent repeat calls share the same result.
+
+        Args:
+            product_id (Union[int, str]): ID of the product to fetch
+
+        Returns:
+            Optional[dict]: Product data dictionary or None if fetch failed
+        """
+        # Ids can arrive as int or str depending on the source file
+        key = str(product_id)
+        cached = self._products.get(key)
+        if cached is not None:
+            self._products.move_to_end(key)
+            # Shielded so a cancelled duplicate does not cancel the shared fetch
+            return await asyncio.shield(cached)
+
+        future = asyncio.get_running_loop().create_future()
+        self._products[key] = future
+        if len(self._products) > PRODUCT_CACHE_SIZE:
+            self._products.popitem(last=False)
+
+        product = None
+        try:
+            product = await self._request_product(product_id)
+            return product
+        finally:
+            future.set_result(product)
+            # Failures are not cached, a later duplicate tries again
+            if product is None and self._products.get(key) is future:
+                del self._products[key]
+
+    async def _request_product(self, product_id: Union[int, str]) -> Optional[dict]:
+        """
+        Request one product from the API.
+
         Args:
             product_id (Union[int, str]): ID of the product to fetch
 
@@ -102,27 +401,32 @@ class ProductExtractor:
             Uses semaphore to limit concurrent requests and includes
             comprehensive error handling for JSON decode and HTTP errors
         """
-        async with self.semaphore:
-            res = None
-            try:
-                # Make request to product API endpoint
-                res = await self.client.get(
-                    url=f"{self.base_url}{product_id}/", timeout=self.timeout
-                )
-                result = res.json()
-                # Extract product data from API response structure
-                return result["data"]["product"]
-            except json.JSONDecodeError as e:
-                self.logger.error(f"Json decode error for {product_id} with {e}")
-            except Exception as e:
-                # Get HTTP status code if available for better error reporting
-                status = getattr(res, "status", "unknown")
-                self.logger.error(
-                    f"Unexpected error {e} status code {status} for product {product_id}"
-                )
-            return None
+        cached = self._etags.get(str(product_id))
+        # Conditional request: an unchanged product comes back as an empty 304
+        headers = {"If-None-Match": cached[0]} if cached else None
+        res = None
+        try:
+            # Make request to product API endpoint
+            res = await self._get(f"{self.base_url}{product_id}/", headers=headers)
+            if cached and res.status_code == 304:
+                return await asyncio.to_thread(self._read_cached_product, *cached[1:])
+            result = await _parse_json(res.content)
+            # Extract product data from API response structure
+            product = result["data"]["product"]
+            if self._etag_fd is not None and (etag := res.headers.get("ETag")):
+                await self._append_etag(str(product_id), etag, product)
+            return product
+        except orjson.JSONDecodeError as e:
+            self.logger.error(f"Json decode error for {product_id} with {e}")
+        except Exception as e:
+            # Get HTTP status code if available for better error reporting
+            status = getattr(res, "status_code", "unknown")
+            self.logger.error(
+                f"Unexpected error {e} status code {status} for product {product_id}"
+            )
+        return None
 
-    @async_time()
+    @async_time(logger)
     async def fetch_brand_products(
         self,
         brand_id: Union[int, str],
@@ -140,123 +444,99 @@ class ProductExtractor:
         """
         self.logger.debug(f"Fetching the Brand Products {brand_id}")
 
-        # Create tasks for fetching product data for each product
-        tasks = [asyncio.create_task(self.fetch_product(pid)) for pid in product_ids]
-
-        # Wait for all tasks to complete with timeout
-        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
-        self.logger.debug(f"Done task : {len(done)} , Pending tassk : {len(pending)} ")
-
-        # Initialize result structure for this brand
-        result_by_brand = {brand_id: list()}
-
-        # Collect results from completed tasks
-        for task in done:
-            try:
-                item = task.result()
-                if item is not None:
-                    result_by_brand[brand_id].append(item)
-            except Exception as e:
-                self.logger.error(f"Found error {e} when processing")
+        # Fetch product data for each product, bounded by the concurrency limit
+        products = await self._fan_out(
+            self.fetch_product, ((pid,) for pid in product_ids), self.call_timeout
+        )
+        result_by_brand = {brand_id: products}
 
         self.logger.info(f"{brand_id} Fetched")
         return result_by_brand
 
-    @async_time()
+    def _comments_url_prefix(self, product_id: Union[int, str]) -> str:
+        """Comments URL of a product up to the page number, built once per product."""
+        return f"{self.comments_base_url}{product_id}/?page="
+
+    @async_time(logger)
     async def _fetch_comments_page(
-        self, product_id: Union[int, str], page_number: int
+        self,
+        product_id: Union[int, str],
+        page_number: int,
+        url_prefix: Optional[str] = None,
     ) -> List[dict]:
         """
         Fetch comments from a specific page for a product.
 
-        This is a private helper method used by fetch_product_comments
-        to handle pagination of comments.
+        This is a private helper method used by the page workers of
+        fetch_brand_comments to handle pagination of comments.
 
         Args:
             product_id (Union[int, str]): ID of the product
             page_number (int): Page number to fetch
+            url_prefix (Optional[str]): Prebuilt _comments_url_prefix of the product
 
         Returns:
             List[dict]: List of comment dictionaries from the specified page
         """
-        async with self.semaphore:
-            res = None
-            try:
-                # Construct URL for specific page of comments
-                url = f"{self.comments_base_url}{product_id}/?page={page_number}"
-                res = await self.client.get(url=url, timeout=self.timeout)
-                result = res.json()
-                # Extract comments from API response, default to empty list if not found
-                return result["data"].get("comments", [])
-            except json.JSONDecodeError as e:
-                self.logger.error(
-                    f"Json decode error for comments of {product_id} page {page_number} with {e}"
-                )
-            except Exception as e:
-                # Get HTTP status code if available for better error reporting
-                status = getattr(res, "status", "unknown")
-                self.logger.error(
-                    f"Unexpected error {e} status code {status} for comments of product {product_id} page {page_number}"
-                )
-            return []
+        # Construct URL for specific page of comments
+        if url_prefix is None:
+            url_prefix = self._comments_url_prefix(product_id)
+        url = url_prefix + str(page_number)
+
+        @retry_transient
+        async def stream_page() -> List[dict]:
+            async with self._request_slot():
+                try:
+                    async with self.client.stream(
+                        "GET", url=url, timeout=self.timeout
+                    ) as res:
+                        raise_for_retryable_status(res)
+                        # Decode only the comments; product, pager and the rest
+                        # of the payload are skipped without building objects
+                        comments = ijson.items(
+                            AsyncByteStream(res.aiter_bytes()),
+                            "data.comments.item",
+                            use_float=True,
+                        )
+                        return [comment async for comment in comments]
+                except Exception as e:
+                    await self._back_off_if_out_of_files(e)
+                    raise
 
-    @async_time()
-    async def fetch_product_comments(self, product_id: Union[int, str]) -> List[dict]:
-        """
-        Fetch all comments for a specific product across all pages.
+        try:
+            return await stream_page()
+        except ijson.JSONError as e:
+            self.logger.error(
+                f"Json decode error for comments of {product_id} page {page_number} with {e}"
+            )
+        except Exception as e:
+            self.logger.error(
+                f"Unexpected error {e} for comments of product {product_id} page {page_number}"
+            )
+        return []
 
-        This method handles pagination by first fetching the first page to determine
-        total pages, then concurrently fetching all remaining pages.
+    async def _fetch_first_comments_page(
+        self, product_id: Union[int, str], url_prefix: Optional[str] = None
+    ) -> Tuple[List[dict], int]:
+        """
+        Fetch the first comments page of a product together with its page count.
 
         Args:
-            product_id (Union[int, str]): ID of the product to fetch comments for
+            product_id (Union[int, str]): ID of the product
+            url_prefix (Optional[str]): Prebuilt _comments_url_prefix of the product
 
         Returns:
-            List[dict]: List of all comment dictionaries for the product
+            Tuple[List[dict], int]: Comments of page 1 and the total number of pages
 
         Note:
-            Returns empty list if any error occurs during the process
+            Errors are raised to the caller, which decides how to report them
         """
-        try:
-            # First page to get total pages and initial comments
-            first_page_url = f"{self.comments_base_url}{product_id}/?page=1"
-            first_page_response = await self.client.get(
-                url=first_page_url, timeout=self.timeout
-            )
-            first_page_result = first_page_response.json()
-            total_pages = first_page_result["data"]["pager"]["total_pages"]
-
-            # Gather comments from page 1 (already fetched)
-            comments: List[dict] = first_page_result["data"].get("comments", [])
+        url_prefix = url_prefix or self._comments_url_prefix(product_id)
+        res = await self._get(url_prefix + "1")
+        data = (await _parse_json(res.content))["data"]
+        return data.get("comments", []), int(data["pager"]["total_pages"])
 
-            # If only one page, return the comments we already have
-            if int(total_pages) <= 1:
-                return comments
-
-            # Create tasks for remaining pages (2..total_pages)
-            tasks = [
-                asyncio.create_task(self._fetch_comments_page(product_id, page_number))
-                for page_number in range(2, int(total_pages) + 1)
-            ]
-
-            # Wait for all page tasks to complete
-            done, _ = await asyncio.wait(tasks, timeout=self.timeout)
-
-            # Aggregate comments from all pages
-            for task in done:
-                try:
-                    comments.extend(task.result())
-                except Exception as e:
-                    self.logger.error(
-                        f"Found error {e} when aggregating comments for product {product_id}"
-                    )
-
-            return comments
-        except Exception as e:
-            self.logger.error(f"Failed to fetch comments for product {product_id}: {e}")
-            return []
-
-    @async_time()
+    @async_time(logger)
     async def fetch_brand_comments(
         self, brand_id: Union[int, str], product_ids: List[Union[int, str]]
     ) -> dict:
@@ -269,34 +549,101 @@ class ProductExtractor:
 
         Returns:
             dict: Dictionary with brand_id as key and list of fetched data as value
+
+        Note:
+            Works as a two-stage pipeline: page 1 of each product is fetched to
+            discover its page count, and the remaining pages are queued for a
+            fixed pool of `concurrency` workers. Pages up to
+            SPECULATIVE_COMMENT_PAGES are queued before page 1 returns
         """
         self.logger.debug(f"Fetching the Brand Products {brand_id}")
 
-        # Create tasks for fetching product data for each product
-        tasks = [
-            asyncio.create_task(self.fetch_product_comments(pid)) for pid in product_ids
-        ]
-
-        # Wait for all tasks to complete with timeout
-        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
-        self.logger.debug(f"Done task : {len(done)} , Pending tassk : {len(pending)} ")
-
-        # Initialize result structure for this brand
-        result_by_brand = {brand_id: list()}
-
-        # Collect results from completed tasks
-        for task in done:
+        # Comments of each product by page number, joined in page order at the end
+        pages_by_product: DefaultDict[Union[int, str], Dict[int, List[dict]]]
+        pages_by_product = defaultdict(dict)
+        # Known once page 1 of the product has been fetched
+        total_pages_by_product: Dict[Union[int, str], int] = {}
+        # Bounded so discovery cannot run far ahead of the page workers
+        pages: asyncio.Queue = asyncio.Queue(maxsize=2 * self.concurrency)
+
+        async def discover(product_id: Union[int, str]) -> None:
+            # Stage 1: page 1 gives the first comments and the page count. Only
+            # the request is bounded; waiting on a full queue below is not a
+            # failure and must not drop the product's remaining pages
+            url_prefix = self._comments_url_prefix(product_id)
+            first_page = asyncio.create_task(
+                asyncio.wait_for(
+                    self._fetch_first_comments_page(product_id, url_prefix),
+                    self.call_timeout,
+                )
+            )
             try:
-                item = task.result()
-                if item is not None:
-                    result_by_brand[brand_id].append(item)
-            except Exception as e:
-                self.logger.error(f"Found error {e} when processing")
+                # Most products have only a few pages, so the next ones are
+                # queued while page 1 is in flight
+                for page_number in range(2, SPECULATIVE_COMMENT_PAGES + 1):
+                    await pages.put((product_id, page_number, url_prefix))
+                comments, total_pages = await first_page
+            except BaseException:
+                # Speculative pages of a product without page 1 are dropped
+                total_pages_by_product[product_id] = 0
+                raise
+            finally:
+                if not first_page.done():
+                    first_page.cancel()
+                    await asyncio.gather(first_page, return_exceptions=True)
+            total_pages_by_product[product_id] = total_pages
+            pages_by_product[product_id][1] = comments
+            for page_number in range(SPECULATIVE_COMMENT_PAGES + 1, total_pages + 1):
+                await pages.put((product_id, page_number, url_prefix))
+
+        async def fetch_pages() -> None:
+            # Stage 2: a fixed pool of workers drains the remaining pages
+            while True:
+                try:
+                    product_id, page_number, url_prefix = await pages.get()
+                except asyncio.QueueShutDown:
+                    return
+                try:
+                    # Speculative pages past the last page are not requested
+                    # once the page count is known
+                    if page_number <= total_pages_by_product.get(
+                        product_id, page_number
+                    ):
+                        pages_by_product[product_id][page_number] = (
+                            await self._fetch_comments_page(
+                                product_id, page_number, url_prefix
+                            )
+                        )
+                finally:
+                    pages.task_done()
+
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(self.concurrency):
+                tg.create_task(fetch_pages())
+            try:
+                await self._fan_out(discover, ((pid,) for pid in product_ids), None)
+                await pages.join()
+            finally:
+                pages.shutdown()
+
+        result_by_brand = {
+            brand_id: [
+                [
+                    comment
+                    for page_number, page in sorted(pages_by_product[pid].items())
+                    # Speculative pages that finished before page 1 may be past
+                    # the last page
+                    if page_number <= total_pages_by_product.get(pid, 0)
+                    for comment in page
+                ]
+                for pid in product_ids
+            ]
+        }
 
         self.logger.info(f"{brand_id} Fetched")
         return result_by_brand
 
-    @async_time()
+    @async_time(logger)
     async def run(
         self,
         brands_info: Dict[Union[int, str], List[Union[int, str]]],
@@ -310,7 +657,6 @@ class ProductExtractor:
         Args:
             brands_info (Dict[Union[int, str], List[Union[int, str]]]):
                 Dictionary mapping brand IDs to lists of product IDs
-            comments (bool): If True, fetch comments; if False, fetch product data
 
         Returns:
             List[dict]: List of dictionaries, each containing brand data
@@ -318,53 +664,125 @@ class ProductExtractor:
         Note:
             Only processes brands that have non-empty product ID lists
         """
-        match self.state:
-            case "Products":
-                tasks = [
-                    asyncio.create_task(
-                        self.fetch_brand_products(brand_id, product_ids)
-                    )
-                    for brand_id, product_ids in brands_info.items()
-                    if len(product_ids) != 0
-                ]
-            case "Comments":
-                tasks = [
-                    asyncio.create_task(
-                        self.fetch_brand_comments(brand_id, product_ids)
-                    )
-                    for brand_id, product_ids in brands_info.items()
-                    if len(product_ids) != 0
-                ]
+        all_results = [result async for result in self.iter_brand_results(brands_info)]
+        self.logger.info("Completed")
+        return all_results
 
-        # Wait for all brand processing tasks to complete
-        done, pending = await asyncio.wait(tasks, timeout=self.timeout)  # pyright: ignore
-        self.logger.debug(f"Done task : {len(done)} , Pending tassk : {len(pending)} ")
+    async def iter_brand_results(
+        self,
+        brands_info: Dict[Union[int, str], List[Union[int, str]]],
+    ) -> AsyncIterator[dict]:
+        """
+        Process all brands and yield each brand's data as soon as it is fetched.
 
-        # Collect all results from completed tasks
-        all_results: List[dict] = []
-        for task in done:
-            try:
-                all_results.append(task.result())
-            except Exception as e:
-                self.logger.error(f"Found error {e} when processing a brand")
+        Unlike run, finished brands are not kept, so the results can be written
+        out one brand at a time (see save_stream).
 
-        self.logger.info("Completed")
-        return all_results
+        Args:
+            brands_info (Dict[Union[int, str], List[Union[int, str]]]):
+                Dictionary mapping brand IDs to lists of product IDs
 
-    @async_time()
+        Yields:
+            dict: Dictionary with brand_id as key and list of fetched data as value
+
+        Note:
+            Only processes brands that have non-empty product ID lists
+        """
+        match self.state:
+            case "Products":
+                fetch_brand = self.fetch_brand_products
+            case "Comments":
+                fetch_brand = self.fetch_brand_comments
+            case _:
+                raise ValueError(f"Unknown extractor state {self.state!r}")
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for brand_id, product_ids in brands_info.items():
+            if len(product_ids) != 0:
+                pending.put_nowait((brand_id, product_ids))
+        # Nothing else is queued; workers stop once the queue is drained
+        pending.shutdown()
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def brand_worker() -> None:
+            while True:
+                try:
+                    brand_id, product_ids = await pending.get()
+                except asyncio.QueueShutDown:
+                    return
+                # Not bounded as a whole: each product or comments page call
+                # inside the brand is already bounded by call_timeout
+                try:
+                    result = await fetch_brand(brand_id, product_ids)
+                except Exception as e:
+                    self.logger.error(f"Found error {e!r} when processing {brand_id}")
+                    continue
+                finished.put_nowait(result)
+
+        async def run_workers() -> None:
+            # A fixed pool of long-lived workers instead of one task per brand
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(min(self.concurrency, pending.qsize())):
+                    tg.create_task(brand_worker())
+
+        producer = asyncio.create_task(run_workers())
+        # Queued brands are still handed out after shutdown, then get() raises
+        producer.add_done_callback(lambda _: finished.shutdown())
+        try:
+            while True:
+                try:
+                    yield await finished.get()
+                except asyncio.QueueShutDown:
+                    break
+            await producer
+        finally:
+            # Also reached when the consumer stops early; tear the workers down
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    @async_time(logger)
     async def save(self, data: Any, file_name: str) -> None:
         """
         Save data to a JSON file asynchronously.
 
+        The whole file is built in memory and indented, so this is meant for
+        small or debugging outputs; prefer save_stream for full runs.
+
         Args:
             data (Any): Data to save (will be JSON serialized)
             file_name (str): Path to the output file
 
         Note:
-            Uses aiofiles for asynchronous file I/O operations
+            The file is written in one call on a worker thread
+        """
+        content = orjson.dumps(data, option=_SAVE_OPTIONS | orjson.OPT_INDENT_2)
+        await asyncio.to_thread(Path(file_name).write_bytes, content)
+
+    @async_time(logger)
+    async def save_stream(self, results: AsyncIterator[dict], file_name: str) -> int:
+        """
+        Write brand results to a JSON array file as they arrive.
+
+        Only one brand is held in memory at a time, and the output is written
+        without indentation.
+
+        Args:
+            results (AsyncIterator[dict]): Brand results, e.g. from iter_brand_results
+            file_name (str): Path to the output file
+
+        Returns:
+            int: Number of brands written
         """
-        async with aiofiles.open(file_name, "w") as f:
-            await f.write(json.dumps(data, indent=4))
+        count = 0
+        async with aiofiles.open(file_name, "wb") as f:
+            await f.write(b"[")
+            async for brand_result in results:
+                if count:
+                    await f.write(b",")
+                await f.write(orjson.dumps(brand_result, option=_SAVE_OPTIONS))
+                count += 1
+            await f.write(b"]")
+        return count
 
     @staticmethod
     def load_brands_info(file_path: str) -> Optional[Dict]:
@@ -381,42 +799,45 @@ class ProductExtractor:
             This is a static method for utility purposes
         """
         try:
-            with open(file_path, "r") as f:
-                return json.load(f)
+            with open(file_path, "rb") as f:
+                return orjson.loads(f.read())
         except Exception as e:
             print(f"File not found and accure erroe {e} ")
             return None
 
 
-# This section demonstrates how to use the ProductExtractor class
-
-# # Load brand information from file
-# file_path = "data/original_data/brand_ex.json"
-# try:
-#     with open(file_path, "r") as f:
-#         brands_info = json.load(f)
-# except Exception as e:
-#     print(f"File not found and accure erroe {e} ")
-#     brands_info = None
-
-
-# state="Products"
-# # Execute extraction if brand info is available
-# if brands_info:
-#     # Initialize extractor with configuration
-#     extractor = ProductExtractor(base_url=PRODUCT_BASE_URL, timeout=400,comments_base_url=COMMENTS_BASE_URL,state=state)
-
-
-#     # Run extraction process
-#     all_results = asyncio.run(
-#         extractor.run(brands_info=brands_info)
-#     )
-
-#     # Print number of results
-#     print(len(all_results))
-
-
-#     out_file = f"data/original_data/{state}_{timestamp}.json"
+async def main(
+    brands_file: str = "data/original_data/brand_ex.json", state: str = "Products"
+) -> None:
+    """
+    Extract products or comments for the brands saved in brands_file.
 
-#     # Save results to file
-#     asyncio.run(extractor.save(all_results, out_file))
+    The brands file is read without blocking the loop, and the extraction and
+    the save share one event loop and one client, so pooled connections are
+    reused. Nothing runs on import.
+    """
+    _setup_logging()
+    try:
+        data = await asyncio.to_thread(Path(brands_file).read_bytes)
+        brands_info = orjson.loads(data)
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.error(f"Could not load brands info from {brands_file}: {e}")
+        return
+
+    out_file = f"data/original_data/{state}_{datetime.now():%Y-%m-%d_%H-%M-%S}.json"
+    async with ProductExtractor(
+        base_url=PRODUCT_BASE_URL,
+        timeout=400,
+        comments_base_url=COMMENTS_BASE_URL,
+        state=state,
+        etag_cache_path=PRODUCT_ETAG_CACHE if state == "Products" else "",
+    ) as extractor:
+        # Brands are written as they finish instead of being collected first
+        count = await extractor.save_stream(
+            extractor.iter_brand_results(brands_info), out_file
+        )
+    logger.info(f"Saved {count} brands to {out_file}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(), loop_factory=loop_factory)
@@ -1,8 +1,13 @@
+import asyncio
+
 import pytest
 
 import sys
 import os
 
+import httpx
+import orjson
+
 
 
 # Ensure the parent directory is in the path for imports
@@ -11,6 +16,144 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from data.brand_ex import Extractor
 from data.config import URL, QUERY, TIMEOUT
 
+@pytest.mark.asyncio
+async def test_context_manager_closes_client():
+    """
+    Test that leaving the async context closes the shared HTTP client.
+    """
+    async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as extractor:
+        assert not extractor.client.is_closed
+    assert extractor.client.is_closed
+
+def pages_handler(total_pages, requested_pages=None):
+    """
+    Build a MockTransport handler serving fake brand pages: page N holds ids N*10 and N*10+1.
+    """
+    def handler(request):
+        page = int(request.url.params["page"])
+        if requested_pages is not None:
+            requested_pages.append(page)
+        products = [{"id": page * 10}, {"id": page * 10 + 1}]
+        return httpx.Response(
+            200,
+            json={"data": {"products": products, "pager": {"total_pages": total_pages}}},
+        )
+
+    return handler
+
+def mock_pages_client(total_pages, requested_pages=None):
+    return httpx.AsyncClient(
+        transport=httpx.MockTransport(pages_handler(total_pages, requested_pages))
+    )
+
+@pytest.mark.asyncio
+async def test_mocked_pages_product_ids_are_merged():
+    """
+    Test that ids from all pages are merged without hitting the network.
+    """
+    async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as extractor:
+        await extractor.client.aclose()
+        extractor.client = mock_pages_client(total_pages=3)
+        result = await extractor.get_product_ids_of_each_brand(1, total_pages=3)
+    assert result == {10, 11, 20, 21, 30, 31}
+
+@pytest.mark.asyncio
+async def test_mocked_first_page_is_fetched_once():
+    """
+    Test that page 1 provides both the page count and its ids, and is requested only once.
+    """
+    requested_pages = []
+    async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as extractor:
+        await extractor.client.aclose()
+        extractor.client = mock_pages_client(total_pages=3, requested_pages=requested_pages)
+        total_pages, first_ids = await extractor.get_first_page_of_each_brand(1)
+        rest = await extractor.get_product_ids_of_each_brand(1, total_pages=total_pages, start_page=2)
+    assert total_pages == 3
+    assert first_ids == {10, 11}
+    assert rest == {20, 21, 30, 31}
+    assert sorted(requested_pages) == [1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_mocked_transient_status_is_retried():
+    """
+    Test that a 503 on a page is retried instead of dropping the page.
+    """
+    serve_page = pages_handler(total_pages=1)
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url)
+        if len(attempts) == 1:
+            return httpx.Response(503)
+        return serve_page(request)
+
+    async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        total_pages, first_ids = await extractor.get_first_page_of_each_brand(1)
+    assert (total_pages, first_ids) == (1, {10, 11})
+    assert len(attempts) == 2
+
+@pytest.mark.asyncio
+async def test_mocked_brands_are_streamed():
+    """
+    Test that brand (id, code) pairs are decoded from a streamed response.
+    """
+    options = [{"id": 18, "code": "samsung", "title": "x"}, {"id": 10, "code": "apple"}]
+
+    def handler(request):
+        return httpx.Response(200, json={"data": {"filters": {"brands": {"options": options}}}})
+
+    async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        result = await extractor.get_all_brands()
+    assert result == {(18, "samsung"), (10, "apple")}
+
+@pytest.mark.asyncio
+async def test_mocked_brands_are_fetched_once():
+    """
+    Test that repeated and concurrent brand lookups share one request.
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(200, json={"data": {"filters": {"brands": {"options": [{"id": 18, "code": "samsung"}]}}}})
+
+    async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        first, second = await asyncio.gather(extractor.get_all_brands(), extractor.get_all_brands())
+        third = await extractor.get_all_brands()
+    assert first == second == third == {(18, "samsung")}
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_mocked_ids_are_saved_as_ndjson(tmp_path):
+    """
+    Test that each brand is written as one NDJSON line of its ids.
+    """
+    serve_page = pages_handler(total_pages=2)
+
+    def handler(request):
+        if "page" not in request.url.params:
+            options = [{"id": 1, "code": "a"}, {"id": 2, "code": "b"}]
+            return httpx.Response(200, json={"data": {"filters": {"brands": {"options": options}}}})
+        return serve_page(request)
+
+    out_file = tmp_path / "ids.ndjson"
+    async with Extractor(base_url=URL, query=QUERY, timeout=TIMEOUT) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        written = await extractor.save_ids_by_brand(str(out_file))
+
+    lines = [orjson.loads(line) for line in out_file.read_bytes().splitlines()]
+    assert written == 2
+    assert {line["brand"] for line in lines} == {1, 2}
+    for line in lines:
+        assert sorted(line["ids"]) == [10, 11, 20, 21]
+
 @pytest.mark.asyncio
 async def test_get_all_brands():
     """
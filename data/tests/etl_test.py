@@ -2,7 +2,10 @@ import json
 
 from pathlib import Path
 
+import bson
 import pytest
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
 
 from data import etl
 
@@ -40,6 +43,13 @@ def test_find_latest_file_select_latest(tmp_path):
     assert res.endswith("Products_2025-01-02_01.json")
 
 
+def test_find_latest_file_orders_by_time_within_a_day(tmp_path):
+    for name in ("Products_2025-08-24_09-00-00.json", "Products_2025-08-24_16-36-04.json"):
+        (tmp_path / name).write_text("{}")
+    res = etl.find_latest_file(str(tmp_path), "Products")
+    assert res.endswith("Products_2025-08-24_16-36-04.json")
+
+
 def test_transform_products_creates_updateone_and_skips_invalid():
     # valid product
     product_ok = {
@@ -68,7 +78,8 @@ def test_transform_products_creates_updateone_and_skips_invalid():
     op = ops[0]
     # UpdateOne exposes private attrs; check they contain expected values
     assert op._filter == {"_id": "p1"}
-    doc = op._doc
+    # The update is pre-encoded BSON
+    doc = bson.decode(op._doc.raw)
     assert "$set" in doc
     setdoc = doc["$set"]
     assert setdoc["title_en"] == "English Title"
@@ -79,9 +90,79 @@ def test_transform_products_creates_updateone_and_skips_invalid():
     assert "m.jpg" in setdoc["images"]
 
 
+def test_transform_products_leaves_missing_fields_out_of_set():
+    product = {"id": "p1", "title_en": "T", "brand": {"code": "b"}, "category": {"code": "c"}, "specifications": {}}
+    setdoc = bson.decode(etl.transform_products([product])[0]._doc.raw)["$set"]
+    assert "title_fa" not in setdoc
+    assert "price" not in setdoc
+    assert setdoc["colors"] == []
+    assert setdoc["num_comments"] == 0
+
+
+def test_transform_products_ignores_list_default_variant():
+    product = {
+        "id": "p1", "title_en": "T", "brand": {}, "category": {"code": "c"},
+        "specifications": {}, "default_variant": [],
+    }
+    setdoc = bson.decode(etl.transform_products([product])[0]._doc.raw)["$set"]
+    assert "price" not in setdoc
+    assert "brand" not in setdoc
+
+
+@pytest.mark.asyncio
+async def test_load_comments_upserts_by_comment_id():
+    written = []
+
+    class Result:
+        upserted_count, modified_count = 1, 0
+
+    class FakeCollection:
+        async def bulk_write(self, ops, **kwargs):
+            written.extend(ops)
+            return Result()
+
+        async def delete_many(self, query):
+            deleted.append(query)
+
+    deleted = []
+    doc = {"_id": 7, "product_id": "p1", "created_at": "2023-01-01", "body": "b"}
+    count = await etl.load_comments(FakeCollection(), [doc])
+    assert count == 1
+    assert written[0]._filter == {"_id": 7}
+    assert "_id" not in written[0]._doc["$set"]
+    assert written[0]._upsert is True
+    # Only comments stored before API ids (ObjectId _id) are removed
+    assert deleted == [{"product_id": {"$in": ["p1"]}, "_id": {"$type": "objectId"}}]
+
+
+@pytest.mark.asyncio
+async def test_ensure_comments_index_replaces_legacy_key_index():
+    calls = []
+
+    class FakeCollection:
+        async def drop_index(self, name):
+            calls.append(("drop", name))
+            raise OperationFailure("index not found")
+
+        async def create_index(self, keys, **kwargs):
+            calls.append(("create", keys, kwargs))
+
+    await etl.ensure_comments_index(FakeCollection())
+    assert calls == [("drop", etl.LEGACY_COMMENT_KEY_INDEX), ("create", "product_id", {})]
+
+
+def test_transform_comments_keeps_identical_comments_apart():
+    raw = [
+        {"id": i, "product_id": "p1", "body": "عالی", "created_at": "2023-01-01"}
+        for i in (1, 2)
+    ]
+    assert [doc["_id"] for doc in etl.transform_comments(raw)] == [1, 2]
+
+
 def test_transform_comments_skips_missing_and_parses_images_and_ids():
     raw = [
         {  # valid
+            "id": 101,
             "product_id": "prod1",
             "title": "t",
             "body": "b",
@@ -95,14 +176,19 @@ def test_transform_comments_skips_missing_and_parses_images_and_ids():
             "files": [{"url": ["i1.jpg"]}, {"url": ["i2.jpg"]}],
         },
         {  # missing product_id -> skipped
+            "id": 102,
             "title": "noid",
             "body": "b",
         },
+        {  # missing comment id -> skipped
+            "product_id": "prod1",
+            "body": "b",
+        },
     ]
-    docs, ids = etl.transform_comments(raw)
+    docs = etl.transform_comments(raw)
     assert len(docs) == 1
-    assert ids == ["prod1"]
     doc = docs[0]
+    assert doc["_id"] == 101
     assert doc["product_id"] == "prod1"
     assert "i1.jpg" in doc["images"]
     assert doc["color"] == "Black"
@@ -111,6 +197,26 @@ def test_transform_comments_skips_missing_and_parses_images_and_ids():
     assert doc["dislikes"] == 1
 
 
+@pytest.mark.asyncio
+async def test_load_products_writes_in_batches(monkeypatch):
+    monkeypatch.setattr(etl, "WRITE_BATCH_SIZE", 2)
+    batches = []
+
+    class Result:
+        def __init__(self, n):
+            self.upserted_count, self.modified_count = n, 0
+
+    class FakeCollection:
+        async def bulk_write(self, ops, **kwargs):
+            batches.append(len(ops))
+            return Result(len(ops))
+
+    ops = [UpdateOne({"_id": i}, {"$set": {"x": i}}, upsert=True) for i in range(5)]
+    count = await etl.load_products(FakeCollection(), ops)
+    assert sorted(batches) == [1, 2, 2]
+    assert count == 5
+
+
 @pytest.mark.asyncio
 async def test_extract_product_in_chunks_and_comments_in_chunks(tmp_path, monkeypatch):
     # Prepare product file: list of dicts, each maps a key to list of items
@@ -168,4 +274,45 @@ async def test__process_chunk_async_and_run_chunked_pipeline_concurrently(tmp_pa
 
     total = await etl.run_chunked_pipeline_concurrently(str(path), DummyCollection(), etl.transform_products, fake_load, None, state="product")
     # We had 3 items total, transform produces UpdateOne per item -> fake_load returns count per chunk equal to ops in chunk -> total should be 3
-    assert total == 3
\ No newline at end of file
+    assert total == 3
+
+
+@pytest.mark.asyncio
+async def test_setup_database_schemas_uses_valid_bson_types():
+    validators = {}
+
+    class FakeDB:
+        async def command(self, name, collection, validator):
+            validators[collection] = validator
+
+    def check(node):
+        if isinstance(node, dict):
+            if "bsonType" in node:
+                assert isinstance(node["bsonType"], str)
+            if "items" in node:
+                assert isinstance(node["items"], dict)
+            for value in node.values():
+                check(value)
+
+    await etl.setup_database_schemas(FakeDB())
+    assert len(validators) == 2
+    check(validators)
+
+
+@pytest.mark.asyncio
+async def test_load_products_unacknowledged_writes_use_w0(monkeypatch):
+    monkeypatch.setattr(etl, "ETL_UNACKNOWLEDGED_WRITES", True)
+    calls = []
+
+    class FakeCollection:
+        def with_options(self, write_concern):
+            assert write_concern.document == {"w": 0}
+            return self
+
+        async def bulk_write(self, ops, **kwargs):
+            calls.append(kwargs)
+            return None
+
+    ops = [UpdateOne({"_id": i}, {"$set": {"x": i}}, upsert=True) for i in range(3)]
+    assert await etl.load_products(FakeCollection(), ops) == 3
+    assert calls == [{"ordered": False}]
@@ -24,6 +24,12 @@ def make_dummy_brand_extractor(return_value=None, raise_exc=False):
             self.query = query
             self.timeout = timeout
 
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
         async def get_all_ids_by_brand(self):
             if raise_exc:
                 raise RuntimeError("Brand extraction failed")
@@ -34,11 +40,20 @@ def make_dummy_brand_extractor(return_value=None, raise_exc=False):
 
 def make_dummy_product_extractor(return_value=None, raise_exc=False):
     class DummyPE:
-        def __init__(self, base_url, timeout, state=None, comments_base_url=None):
+        def __init__(
+            self, base_url, timeout, state=None, comments_base_url=None, etag_cache_path=""
+        ):
             self.base_url = base_url
             self.timeout = timeout
             self.state = state
             self.comments_base_url = comments_base_url
+            self.etag_cache_path = etag_cache_path
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
 
         async def run(self, brands_info):
             if raise_exc:
@@ -102,6 +117,38 @@ async def test_run_product_extractor_success_and_exception(monkeypatch):
         )
 
 
+@pytest.mark.asyncio
+async def test_stream_product_extractor_writes_brands_to_file(monkeypatch, tmp_path):
+    class DummyPE:
+        def __init__(self, **kwargs):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        async def iter_brand_results(self, brands_info):
+            for brand_id, ids in brands_info.items():
+                yield {brand_id: [{"id": pid} for pid in ids]}
+
+        async def save_stream(self, results, file_name):
+            items = [r async for r in results]
+            with open(file_name, "w", encoding="utf-8") as f:
+                json.dump(items, f)
+            return len(items)
+
+    monkeypatch.setattr(pipeline, "ProductExtractor", DummyPE)
+    out_path = str(tmp_path / "Products.json")
+    count = await pipeline.stream_product_extractor(
+        products_base_url="http://p", timeout=1, brands_info={"b": [1]}, out_path=out_path
+    )
+    assert count == 1
+    with open(out_path, encoding="utf-8") as f:
+        assert json.load(f) == [{"b": [{"id": 1}]}]
+
+
 @pytest.mark.asyncio
 async def test_products_main_calls_etl_and_saves_json(monkeypatch, tmp_path):
     # Prepare monkeypatches
@@ -111,10 +158,15 @@ async def test_products_main_calls_etl_and_saves_json(monkeypatch, tmp_path):
     async def fake_brand_extraction(timeout, url, query):
         return {"food": [1, 2]}
 
-    # product extractor stub
-    async def fake_product_extractor(products_base_url, timeout, brands_info, state=None, comments_base_url=None):
-        # return product list and metadata
-        return ([{"id": "p1", "name": "foo"}], [{"meta": "m"}])
+    # product extractor stub, writes brands to the output file like save_stream
+    async def fake_stream_product_extractor(
+        products_base_url, timeout, brands_info, out_path, state=None, comments_base_url=None, etag_cache_path=""
+    ):
+        # the products stage reuses unchanged products through the ETag cache
+        assert etag_cache_path == pipeline.PRODUCT_ETAG_CACHE
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump([{"food": [{"id": "p1", "name": "foo"}]}], f)
+        return 1
 
     results = {}
     async def fake_run_products_etl(mongo_uri, product_path, db_name, products_collection):
@@ -127,7 +179,7 @@ async def test_products_main_calls_etl_and_saves_json(monkeypatch, tmp_path):
         return {"status": "ok"}
 
     monkeypatch.setattr(pipeline, "run_brand_extraction", fake_brand_extraction)
-    monkeypatch.setattr(pipeline, "run_product_extractor", fake_product_extractor)
+    monkeypatch.setattr(pipeline, "stream_product_extractor", fake_stream_product_extractor)
     monkeypatch.setattr(pipeline, "run_products_etl", fake_run_products_etl)
 
     out = await pipeline.products_main()
@@ -146,10 +198,13 @@ async def test_comments_main_calls_etl_and_saves_json(monkeypatch, tmp_path):
     async def fake_brand_extraction(timeout, url, query):
         return {"food": [1, 2]}
 
-    # product extractor stub for comments
-    async def fake_product_extractor(products_base_url, timeout, brands_info, state=None, comments_base_url=None):
-        # return comments data as a list-like structure
-        return ([{"id": "c1", "text": "nice"}], [{"meta": "m"}])
+    # product extractor stub for comments, writes brands to the output file
+    async def fake_stream_product_extractor(
+        products_base_url, timeout, brands_info, out_path, state=None, comments_base_url=None
+    ):
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump([{"food": [[{"id": "c1", "text": "nice"}]]}], f)
+        return 1
 
     results = {}
     async def fake_run_comments_etl(mongo_uri, comments_path, db_name, comments_collection):
@@ -161,7 +216,7 @@ async def test_comments_main_calls_etl_and_saves_json(monkeypatch, tmp_path):
         return {"status": "comments_ok"}
 
     monkeypatch.setattr(pipeline, "run_brand_extraction", fake_brand_extraction)
-    monkeypatch.setattr(pipeline, "run_product_extractor", fake_product_extractor)
+    monkeypatch.setattr(pipeline, "stream_product_extractor", fake_stream_product_extractor)
     monkeypatch.setattr(pipeline, "run_comments_etl", fake_run_comments_etl)
 
     out = await pipeline.comments_main()
@@ -180,7 +235,7 @@ def test_main_arg_parsing_calls_products_and_comments(monkeypatch, tmp_path):
     async def fake_comments_main():
         called["comments"] = True
 
-    def fake_asyncio_run(coro):
+    def fake_asyncio_run(coro, loop_factory=None):
         # run the coroutine directly for test
         return asyncio.get_event_loop().run_until_complete(coro)
 
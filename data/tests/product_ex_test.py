@@ -1,9 +1,16 @@
+import asyncio
+import errno
+import json
+
+import httpx
+import orjson
 import pytest
 
 from data.product_ex import ProductExtractor
 
 # Dummy constants for test configuration
 BASE_URL = "https://api.digikala.com/v1/product/"
+COMMENTS_URL = "https://api.digikala.com/v1/rate-review/products/"
 TIMEOUT = 100
 BRAND_ID = 18
 PRODUCT_IDS = [13981188, 18576389]  # Example product IDs from sample data
@@ -13,8 +20,10 @@ NON_EXISTENT_PRODUCT_ID = 99999999  # Assumed not to exist
 async def test_fetch_product_success(monkeypatch):
     # Mock client.get to simulate API response for a valid product
     class DummyResponse:
-        def json(self):
-            return {"data": {"product": {"id": 13981188, "title_fa": "Test Product"}}}
+        status_code = 200
+        content = orjson.dumps(
+            {"data": {"product": {"id": 13981188, "title_fa": "Test Product"}}}
+        )
     async def dummy_get(*args, **kwargs):
         return DummyResponse()
     extractor = ProductExtractor(BASE_URL, TIMEOUT)
@@ -28,8 +37,8 @@ async def test_fetch_product_success(monkeypatch):
 @pytest.mark.asyncio
 async def test_fetch_product_invalid_json(monkeypatch):
     class DummyResponse:
-        def json(self):
-            raise Exception("JSON decode error")
+        status_code = 200
+        content = b"<html>not json</html>"
     async def dummy_get(*args, **kwargs):
         return DummyResponse()
     extractor = ProductExtractor(BASE_URL, TIMEOUT)
@@ -69,6 +78,16 @@ async def test_fetch_brand_products(monkeypatch):
     assert isinstance(result[BRAND_ID], list)
     assert {p["id"] for p in result[BRAND_ID]} == set(PRODUCT_IDS)
 
+@pytest.mark.asyncio
+async def test_fan_out_allows_calls_longer_than_one_attempt():
+    async def slow_call(pid):
+        await asyncio.sleep(0.05)  # longer than one attempt, within the retry budget
+        return pid
+
+    extractor = ProductExtractor(BASE_URL, 0.01)
+    args = [(pid,) for pid in PRODUCT_IDS]
+    assert await extractor._fan_out(slow_call, args, extractor.call_timeout) == PRODUCT_IDS
+
 @pytest.mark.asyncio
 async def test_fetch_brand_products_all_failures(monkeypatch):
     async def always_none(pid):
@@ -80,3 +99,307 @@ async def test_fetch_brand_products_all_failures(monkeypatch):
     result = await extractor.fetch_brand_products(BRAND_ID, PRODUCT_IDS)
     assert result[BRAND_ID] == []
 
+
+@pytest.mark.asyncio
+async def test_run_keeps_brand_tasks_bounded(monkeypatch):
+    active = peak = 0
+
+    async def dummy_fetch_brand_products(brand_id, product_ids):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0)
+        active -= 1
+        return {brand_id: product_ids}
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT, concurrency=2, state="Products")
+    extractor.fetch_brand_products = dummy_fetch_brand_products
+
+    brands_info = {brand_id: [brand_id * 10] for brand_id in range(1, 7)}
+    brands_info[7] = []  # brands without products are skipped
+    result = await extractor.run(brands_info)
+    assert peak <= 2
+    assert sorted(result, key=lambda r: next(iter(r))) == [
+        {brand_id: [brand_id * 10]} for brand_id in range(1, 7)
+    ]
+
+@pytest.mark.asyncio
+async def test_run_keeps_brands_longer_than_one_request_timeout():
+    async def slow_fetch_product(pid):
+        await asyncio.sleep(0.3)  # each product fits its own call budget
+        return {"id": pid}
+
+    extractor = ProductExtractor(BASE_URL, 0.2, concurrency=1, state="Products")
+    extractor.fetch_product = slow_fetch_product
+
+    result = await extractor.run({BRAND_ID: PRODUCT_IDS})
+    assert result == [{BRAND_ID: [{"id": pid} for pid in PRODUCT_IDS]}]
+
+@pytest.mark.asyncio
+async def test_fetch_brand_comments_queues_remaining_pages(monkeypatch):
+    total_pages = {PRODUCT_IDS[0]: 3, PRODUCT_IDS[1]: 1}
+    fetched_pages = []
+
+    async def dummy_first_page(pid, url_prefix=None):
+        return [{"pid": pid, "page": 1}], total_pages[pid]
+
+    async def dummy_comments_page(pid, page_number, url_prefix=None):
+        fetched_pages.append((pid, page_number))
+        await asyncio.sleep(0.01 * (3 - page_number))  # page 3 finishes first
+        return [{"pid": pid, "page": page_number}]
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT, concurrency=2)
+    extractor._fetch_first_comments_page = dummy_first_page
+    extractor._fetch_comments_page = dummy_comments_page
+
+    result = await extractor.fetch_brand_comments(BRAND_ID, PRODUCT_IDS)
+    # Pages 2..4 of every product may also be requested speculatively
+    assert {(PRODUCT_IDS[0], 2), (PRODUCT_IDS[0], 3)} <= set(fetched_pages)
+    first, second = result[BRAND_ID]
+    assert [c["page"] for c in first] == [1, 2, 3]
+    assert second == [{"pid": PRODUCT_IDS[1], "page": 1}]
+
+@pytest.mark.asyncio
+async def test_fetch_brand_comments_drops_speculative_pages(monkeypatch):
+    async def dummy_first_page(pid, url_prefix=None):
+        await asyncio.sleep(0.05)  # speculative pages finish first
+        return [{"page": 1}], 2
+
+    async def dummy_comments_page(pid, page_number, url_prefix=None):
+        return [{"page": page_number}]
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT)
+    extractor._fetch_first_comments_page = dummy_first_page
+    extractor._fetch_comments_page = dummy_comments_page
+
+    result = await extractor.fetch_brand_comments(BRAND_ID, PRODUCT_IDS[:1])
+    assert [c["page"] for c in result[BRAND_ID][0]] == [1, 2]
+
+@pytest.mark.asyncio
+async def test_fetch_product_halves_limit_on_too_many_open_files(monkeypatch):
+    async def dummy_get(*args, **kwargs):
+        raise OSError(errno.EMFILE, "Too many open files")
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT, concurrency=8)
+    extractor.client.get = dummy_get
+
+    assert await extractor.fetch_product(13981188) is None
+    assert extractor._limit == 4
+    await extractor.set_concurrency(0)
+    assert extractor._limit == 1
+
+@pytest.mark.asyncio
+async def test_save_stream_writes_brands_as_json_array(tmp_path):
+    async def dummy_fetch_brand_products(brand_id, product_ids):
+        return {brand_id: [{"id": pid} for pid in product_ids]}
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT, state="Products")
+    extractor.fetch_brand_products = dummy_fetch_brand_products
+
+    out_file = tmp_path / "products.json"
+    brands_info = {BRAND_ID: PRODUCT_IDS, 19: [], 20: [1]}
+    count = await extractor.save_stream(
+        extractor.iter_brand_results(brands_info), str(out_file)
+    )
+    assert count == 2
+    saved = json.loads(out_file.read_text())
+    assert sorted(saved, key=lambda r: next(iter(r))) == [
+        {str(BRAND_ID): [{"id": pid} for pid in PRODUCT_IDS]},
+        {"20": [{"id": 1}]},
+    ]
+
+@pytest.mark.asyncio
+async def test_fetch_product_parses_large_body(monkeypatch):
+    product = {"id": 13981188, "description": "x" * (128 * 1024)}
+
+    class DummyResponse:
+        status_code = 200
+        content = orjson.dumps({"data": {"product": product}})
+
+    async def dummy_get(*args, **kwargs):
+        return DummyResponse()
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT)
+    extractor.client.get = dummy_get
+
+    assert await extractor.fetch_product(13981188) == product
+
+@pytest.mark.asyncio
+async def test_mocked_comments_page_is_streamed():
+    comments = [{"id": 1, "rate": 4.5}, {"id": 2, "rate": 3}]
+
+    def handler(request):
+        assert request.url.params["page"] == "2"
+        return httpx.Response(
+            200,
+            json={
+                "data": {
+                    "product": {"id": 13981188},
+                    "comments": comments,
+                    "pager": {"total_pages": 2},
+                }
+            },
+        )
+
+    async with ProductExtractor(
+        BASE_URL, TIMEOUT, comments_base_url=COMMENTS_URL
+    ) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        assert await extractor._fetch_comments_page(13981188, 2) == comments
+
+@pytest.mark.asyncio
+async def test_iter_brand_results_stops_workers_when_closed_early():
+    started = []
+
+    async def slow_fetch_brand_products(brand_id, product_ids):
+        started.append(brand_id)
+        if brand_id != 1:
+            await asyncio.sleep(10)
+        return {brand_id: product_ids}
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT, concurrency=2, state="Products")
+    extractor.fetch_brand_products = slow_fetch_brand_products
+
+    results = extractor.iter_brand_results({1: [10], 2: [20], 3: [30]})
+    assert await anext(results) == {1: [10]}
+    await results.aclose()
+    # The still running brand was cancelled and awaited, not left pending
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+
+@pytest.mark.asyncio
+async def test_fetch_brand_products_keeps_input_order(monkeypatch):
+    async def dummy_fetch_product(pid):
+        # Later products finish first
+        await asyncio.sleep(0.001 * (len(PRODUCT_IDS) - PRODUCT_IDS.index(pid)))
+        return {"id": pid}
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT)
+    extractor.fetch_product = dummy_fetch_product
+
+    result = await extractor.fetch_brand_products(BRAND_ID, PRODUCT_IDS)
+    assert [p["id"] for p in result[BRAND_ID]] == PRODUCT_IDS
+
+@pytest.mark.asyncio
+async def test_fetch_product_deduplicates_ids(monkeypatch):
+    requested = []
+
+    class DummyResponse:
+        status_code = 200
+        content = orjson.dumps({"data": {"product": {"id": 13981188}}})
+
+    async def dummy_get(*args, **kwargs):
+        requested.append(kwargs["url"])
+        await asyncio.sleep(0)
+        return DummyResponse()
+
+    extractor = ProductExtractor(BASE_URL, TIMEOUT)
+    extractor.client.get = dummy_get
+
+    results = await asyncio.gather(
+        extractor.fetch_product(13981188), extractor.fetch_product("13981188")
+    )
+    assert results == [{"id": 13981188}] * 2
+    assert await extractor.fetch_product(13981188) == {"id": 13981188}
+    assert len(requested) == 1
+
+@pytest.mark.asyncio
+async def test_mocked_unchanged_product_is_reused_with_etag(tmp_path):
+    product = {"id": 13981188, "title_fa": "Test Product"}
+    conditional = []
+
+    def handler(request):
+        conditional.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(
+            200, json={"data": {"product": product}}, headers={"ETag": '"v1"'}
+        )
+
+    cache_path = str(tmp_path / "etags.json")
+    for _ in range(2):
+        async with ProductExtractor(
+            BASE_URL, TIMEOUT, etag_cache_path=cache_path
+        ) as extractor:
+            await extractor.client.aclose()
+            extractor.client = httpx.AsyncClient(
+                transport=httpx.MockTransport(handler)
+            )
+            assert await extractor.fetch_product(13981188) == product
+    assert conditional == [None, '"v1"']
+
+@pytest.mark.asyncio
+async def test_etag_cache_is_appended_and_skips_torn_record(tmp_path):
+    product = {"id": 13981188, "title_fa": "Test Product"}
+    cache_path = tmp_path / "etags.ndjson"
+    cache_path.write_bytes(orjson.dumps(["13981188", '"v1"', product]) + b"\n[\"185")
+
+    def handler(request):
+        assert request.headers.get("If-None-Match") == '"v1"'
+        return httpx.Response(304)
+
+    async with ProductExtractor(
+        BASE_URL, TIMEOUT, etag_cache_path=str(cache_path)
+    ) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        assert await extractor.fetch_product(13981188) == product
+        # The torn record is dropped and the next record starts on a new line
+        await extractor._append_etag("18576389", '"v2"', {"id": 18576389})
+    lines = cache_path.read_bytes().splitlines()
+    assert [orjson.loads(line)[0] for line in lines] == ["13981188", "18576389"]
+
+@pytest.mark.asyncio
+async def test_etag_cache_is_compacted_when_records_are_replaced(tmp_path):
+    cache_path = tmp_path / "etags.ndjson"
+    cache_path.write_bytes(b"".join(
+        orjson.dumps(["13981188", f'"v{v}"', {"v": v}]) + b"\n" for v in range(1, 4)
+    ))
+
+    def handler(request):
+        assert request.headers.get("If-None-Match") == '"v3"'
+        return httpx.Response(304)
+
+    async with ProductExtractor(
+        BASE_URL, TIMEOUT, etag_cache_path=str(cache_path)
+    ) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        assert await extractor.fetch_product(13981188) == {"v": 3}
+    assert cache_path.read_bytes().splitlines() == [
+        orjson.dumps(["13981188", '"v3"', {"v": 3}])
+    ]
+
+@pytest.mark.asyncio
+async def test_mocked_throttled_product_is_retried():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        if len(attempts) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"data": {"product": {"id": 13981188}}})
+
+    async with ProductExtractor(BASE_URL, TIMEOUT) as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        assert await extractor.fetch_product(13981188) == {"id": 13981188}
+    assert len(attempts) == 2
+
+@pytest.mark.asyncio
+async def test_mocked_retry_longer_than_one_attempt_survives_run():
+    attempts = []
+
+    async def handler(request):
+        attempts.append(request.url.path)
+        await asyncio.sleep(0.15)  # two attempts outlast one request timeout
+        if len(attempts) == 1:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"data": {"product": {"id": 13981188}}})
+
+    async with ProductExtractor(BASE_URL, 0.2, state="Products") as extractor:
+        await extractor.client.aclose()
+        extractor.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        result = await extractor.run({BRAND_ID: [13981188]})
+    assert result == [{BRAND_ID: [{"id": 13981188}]}]
+    assert len(attempts) == 2
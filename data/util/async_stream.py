@@ -0,0 +1,20 @@
+from typing import AsyncIterator
+
+
+class AsyncByteStream:
+    """
+    Adapts an async iterator of bytes (e.g. httpx ``Response.aiter_bytes()``)
+    to the async file interface that ijson reads from.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes the stream type with read(0); never consume a chunk for it
+        if size == 0:
+            return b""
+        try:
+            return await anext(self._chunks)
+        except StopAsyncIteration:
+            return b""
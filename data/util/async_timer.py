@@ -1,20 +1,37 @@
 import functools
-from typing import Callable, Any
+import logging
+from typing import Callable, Any, Optional
 import time
 
+logger = logging.getLogger(__name__)
+
+
+def async_time(log: Optional[logging.Logger] = None):
+    """
+    Log how long each call of the decorated coroutine takes, at DEBUG level.
+
+    :param log: logging.Logger - Logger to report through; pass the caller's
+        module logger so timings reach the handlers set up by setup_logger
+        (console, when ENABLE_LOGGING is on). Defaults to this module's
+        logger, which has no handlers of its own.
+    """
+    timer_logger = log or logger
 
-def async_time():
     def wrapper(func: Callable) -> Callable:
         @functools.wraps(func)
         async def wrapped(*args, **kwargs) -> Any:
-            # print(f"Stratin {func} with args {args} {kwargs}")
-            start = time.time()
+            # Timing is only reported at DEBUG level; otherwise just run the call.
+            # Checked per call because loggers are configured after import.
+            if not timer_logger.isEnabledFor(logging.DEBUG):
+                return await func(*args, **kwargs)
+            start = time.perf_counter()
             try:
                 return await func(*args, **kwargs)
             finally:
-                end = time.time()
-                total = end - start
-                print(f"finsished {func} in {total:.4f} seconds")
+                total = time.perf_counter() - start
+                timer_logger.debug(
+                    "finished %s in %.4f seconds", func.__qualname__, total
+                )
 
         return wrapped
 
@@ -0,0 +1,5 @@
+try:
+    # libuv-based event loop; the stdlib loop is used where it is unavailable
+    from uvloop import new_event_loop as loop_factory
+except ImportError:
+    loop_factory = None
@@ -0,0 +1,103 @@
+import socket
+
+import tenacity
+from httpx import (
+    AsyncClient,
+    AsyncHTTPTransport,
+    HTTPStatusError,
+    Limits,
+    Response,
+    TransportError,
+)
+
+# Streams multiplex over a few HTTP/2 connections, so the pool can stay small
+MAX_CONNECTIONS = 4
+# Connection attempts retried by the transport before a request sees the error
+CONNECT_RETRIES = 3
+# Idle pooled connections are kept this long (httpx default is 5s), so pauses
+# between brands do not cost a new TLS handshake
+KEEPALIVE_EXPIRY = 90
+# Seconds of silence before the OS starts TCP keep-alive probes
+TCP_KEEPALIVE_IDLE = 60
+
+SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+# TCP_KEEPIDLE is not available on every platform (e.g. older macOS)
+if hasattr(socket, "TCP_KEEPIDLE"):
+    SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPALIVE_IDLE))
+
+
+def build_client(timeout: int) -> AsyncClient:
+    """
+    Build the HTTP client used by the extractors.
+
+    Every extractor gets the same transport settings (HTTP/2, pool size,
+    keep-alive and connect retries), so they behave identically against the
+    API host.
+
+    :param timeout: int - Timeout in seconds for each request
+    """
+    transport = AsyncHTTPTransport(
+        http2=True,
+        retries=CONNECT_RETRIES,
+        limits=Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        socket_options=SOCKET_OPTIONS,
+    )
+    return AsyncClient(transport=transport, timeout=timeout, follow_redirects=True)
+
+
+# Statuses the API returns transiently under fan-out load
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# Longest Retry-After the client is willing to sleep for, in seconds
+MAX_RETRY_AFTER = 30
+# Attempts per call, the first one included
+RETRY_ATTEMPTS = 3
+
+_backoff = tenacity.wait_exponential(multiplier=0.5, max=8) + tenacity.wait_random(
+    0, 0.5
+)
+
+
+def _wait_for_retry(retry_state: tenacity.RetryCallState) -> float:
+    """
+    Honour a numeric Retry-After on throttled responses, else back off with jitter.
+    """
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    if isinstance(error, HTTPStatusError):
+        retry_after = error.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), MAX_RETRY_AFTER)
+    return _backoff(retry_state)
+
+
+# Retry transient failures (connection errors and RETRY_STATUS_CODES); the last
+# error is re-raised so callers log it once
+retry_transient = tenacity.retry(
+    stop=tenacity.stop_after_attempt(RETRY_ATTEMPTS),
+    wait=_wait_for_retry,
+    retry=tenacity.retry_if_exception_type((TransportError, HTTPStatusError)),
+    reraise=True,
+)
+
+
+def retry_budget(timeout: float) -> float:
+    """
+    Longest time a retry_transient call can take when each attempt may run
+    into `timeout`; waits between attempts are at most MAX_RETRY_AFTER.
+
+    :param timeout: float - Per-attempt timeout in seconds
+    """
+    return RETRY_ATTEMPTS * timeout + (RETRY_ATTEMPTS - 1) * MAX_RETRY_AFTER
+
+
+def raise_for_retryable_status(resp: Response) -> None:
+    """
+    Raise HTTPStatusError for a response whose status is worth retrying.
+
+    :param resp: Response - Response to check, streamed or not
+    """
+    if resp.status_code in RETRY_STATUS_CODES:
+        resp.raise_for_status()